@@ -1,25 +1,65 @@
 import os
-from datetime import datetime, timedelta
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from urllib.parse import unquote
 from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import HTTPException
 
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify, url_for
 from flask_jwt_extended import (
     create_access_token,
     JWTManager,
     jwt_required,
     get_jwt_identity,
 )
-from werkzeug.utils import secure_filename
 
 from src.models import db, User, BankStatement, Transaction, ProcessingLog, Bank, TransactionCategory
-from src.auth import create_hashed_password, verify_password, authenticate_user
-from src.ocr_processor import BankStatementOCR
+from src.auth import (
+    create_hashed_password,
+    verify_password,
+    authenticate_user,
+    get_current_user,
+    password_too_long,
+    MAX_PASSWORD_BYTES,
+    is_unknown_email,
+    remember_unknown_email,
+    forget_unknown_email,
+)
 from src.database import DatabaseConfig
+from src.json_provider import OrjsonProvider
+from src.tasks import celery_init_app, run_ocr
+
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
+RESULTS_FOLDER = os.environ.get('RESULTS_FOLDER', 'results')
+
+class UploadRequest(Request):
+    """Request that spools uploaded files straight into UPLOAD_FOLDER"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Writing the multipart body to its final filesystem avoids holding it in
+        # memory and lets save_upload() rename it instead of copying it again
+        stream = tempfile.NamedTemporaryFile(dir=UPLOAD_FOLDER, prefix='.upload_', delete=False)
+        self._upload_paths = getattr(self, '_upload_paths', []) + [stream.name]
+        return stream
+
+    def close(self):
+        super().close()
+        # Remove any spooled uploads that were never claimed by save_upload()
+        for path in getattr(self, '_upload_paths', []):
+            if os.path.exists(path):
+                os.unlink(path)
 
 app = Flask(__name__)
+app.request_class = UploadRequest
+app.json = OrjsonProvider(app)
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', '16')) * 1024 * 1024
 
 app.config['SQLALCHEMY_DATABASE_URI'] = DatabaseConfig.get_database_uri()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = DatabaseConfig.get_engine_options()
 
 jwt_secret = os.environ.get('JWT_SECRET_KEY')
 if not jwt_secret:
@@ -28,20 +68,59 @@ app.config['JWT_SECRET_KEY'] = jwt_secret
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
 jwt = JWTManager(app)
 
-db.init_app(app)
+app.config['CELERY'] = {
+    'broker_url': os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0'),
+    'task_ignore_result': True,
+}
 
-ocr_processor = BankStatementOCR()
+app.config['REDIS_URL'] = os.environ.get('REDIS_URL', app.config['CELERY']['broker_url'])
 
-UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
-RESULTS_FOLDER = os.environ.get('RESULTS_FOLDER', 'results')
+db.init_app(app)
+celery_app = celery_init_app(app)
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
+_ALLOWED_SUFFIXES = tuple(f'.{ext}' for ext in ALLOWED_EXTENSIONS)
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(_ALLOWED_SUFFIXES)
+
+def save_upload(file, filepath):
+    """Move a spooled upload into place, copying in 1 MiB chunks only as a fallback"""
+    spooled_path = getattr(file.stream, 'name', None)
+    if isinstance(spooled_path, str) and os.path.exists(spooled_path):
+        file.stream.close()
+        os.replace(spooled_path, filepath)
+    else:
+        with open(filepath, 'wb') as out:
+            shutil.copyfileobj(file.stream, out, length=1024 * 1024)
+
+def uploaded_files():
+    """
+    Files posted to /ocr/process
+
+    Either multipart 'file' fields, or a single file sent as the raw request
+    body with its (percent-encoded) name in the X-Filename header, which
+    skips multipart encoding and parsing altogether.
+    """
+    filename = request.headers.get('X-Filename')
+    if filename is not None and request.mimetype != 'multipart/form-data':
+        return [FileStorage(stream=request.stream, filename=unquote(filename), content_type=request.mimetype)]
+    return request.files.getlist('file')
+
+def requested_bank_code():
+    """
+    Bank code the client says the statement is from, if any
+
+    Sent as the X-Bank-Code header, or as a 'bank' form field alongside
+    multipart uploads. It selects the bank's OCR preprocessing profile.
+    """
+    code = request.headers.get('X-Bank-Code')
+    if code is None and request.mimetype == 'multipart/form-data':
+        code = request.form.get('bank')
+    return code.strip().upper() if code else None
 
 @app.route('/register', methods=['POST'])
 def register():
@@ -53,6 +132,9 @@ def register():
     if not username or not email or not password:
         return jsonify({'message': 'Missing username, email, or password'}), 400
 
+    if password_too_long(password):
+        return jsonify({'message': f'Password must be at most {MAX_PASSWORD_BYTES} bytes'}), 400
+
     if User.query.filter_by(email=email).first():
         return jsonify({'message': 'User with that email already exists'}), 409
 
@@ -62,6 +144,7 @@ def register():
     try:
         db.session.add(new_user)
         db.session.commit()
+        forget_unknown_email(email)
         return jsonify({'message': 'User registered successfully'}), 201
     except IntegrityError:
         db.session.rollback()
@@ -76,7 +159,13 @@ def login():
     if not email or not password:
         return jsonify({'message': 'Missing email or password'}), 400
 
-    user = User.query.filter_by(email=email).first()
+    # Only misses are cached: a cached user row could carry a stale password hash
+    if is_unknown_email(email):
+        user = None
+    else:
+        user = User.query.filter_by(email=email).first()
+        if user is None:
+            remember_unknown_email(email)
     access_token = authenticate_user(user, password)
 
     if access_token:
@@ -88,40 +177,105 @@ def login():
 @jwt_required()
 def protected():
     current_user_id = get_jwt_identity()
-    return jsonify(logged_in_as=current_user_id), 200
+    return jsonify(logged_in_as=current_user_id, user=get_current_user()), 200
 
 @app.route('/ocr/process', methods=['POST'])
 @jwt_required()
 def ocr_process_file():
     try:
-        if 'file' not in request.files:
+        files = uploaded_files()
+        if not files:
             return jsonify({'error': 'No file part in the request'}), 400
-        file = request.files['file']
-        if file.filename == '':
+        if any(file.filename == '' for file in files):
             return jsonify({'error': 'No selected file'}), 400
-        if not allowed_file(file.filename):
+        if not all(allowed_file(file.filename) for file in files):
             return jsonify({'error': 'Invalid file type. Allowed: pdf, png, jpg, jpeg'}), 400
 
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_filename = f"{timestamp}_{filename}"
-        filepath = os.path.join(UPLOAD_FOLDER, unique_filename)
-        file.save(filepath)
+        bank = None
+        bank_code = requested_bank_code()
+        if bank_code:
+            bank = Bank.query.filter_by(code=bank_code, is_active=True).first()
+            if bank is None:
+                return jsonify({'error': f'Unknown bank: {bank_code}'}), 400
+
+        user_id = uuid.UUID(str(get_jwt_identity()))
+        saved_files = []
+        for file in files:
+            # The extension was validated by allowed_file(); the original name is kept on the row
+            ext = file.filename.rsplit('.', 1)[1].lower()
+            unique_filename = f"{uuid.uuid4().hex}.{ext}"
+            filepath = os.path.join(UPLOAD_FOLDER, unique_filename)
+            save_upload(file, filepath)
+
+            statement = BankStatement(
+                user_id=user_id,
+                original_filename=file.filename,
+                file_path=filepath,
+                file_size=os.path.getsize(filepath),
+                file_type=file.content_type,
+                bank_name=bank.name if bank else None,
+                processing_status='pending'
+            )
+            db.session.add(statement)
+            saved_files.append((unique_filename, filepath, statement))
+        db.session.commit()
 
-        ocr_result = ocr_processor.process_statement(filepath, output_format='dict')
+        # OCR runs on the Celery workers; clients poll the status URL for results
+        results = []
+        for unique_filename, filepath, statement in saved_files:
+            statement_id = str(statement.id)
+            run_ocr.delay(statement_id, filepath)
+            results.append({
+                'filename': unique_filename,
+                'statement_id': statement_id,
+                'status': statement.processing_status,
+                'status_url': url_for('ocr_status', statement_id=statement_id)
+            })
 
+        # The first file's result is mirrored at the top level for single-file clients
         return jsonify({
             'success': True,
-            'filename': unique_filename,
-            'account_info': ocr_result.get('account_info', {}),
-            'transactions': ocr_result.get('transactions', []),
-            'raw_text_preview': ocr_result.get('raw_text', '')[:500]
-        }), 200
+            **results[0],
+            'results': results
+        }), 202
 
+    except HTTPException:
+        # e.g. RequestEntityTooLarge from reading an over-limit raw body
+        raise
     except Exception as e:
         app.logger.error(f"OCR Processing error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/ocr/status/<statement_id>', methods=['GET'])
+@jwt_required()
+def ocr_status(statement_id):
+    try:
+        statement_uuid = uuid.UUID(statement_id)
+    except ValueError:
+        return jsonify({'error': 'Invalid statement id'}), 400
+
+    statement = db.session.get(BankStatement, statement_uuid)
+    if statement is None or str(statement.user_id) != str(get_jwt_identity()):
+        return jsonify({'error': 'Statement not found'}), 404
+
+    response_data = {
+        'statement_id': statement.id,
+        'filename': os.path.basename(statement.file_path or ''),
+        'status': statement.processing_status,
+    }
+    if statement.processing_status == 'completed':
+        transactions = [t.to_dict() for t in statement.transactions]
+        response_data.update({
+            'success': True,
+            'account_info': statement.account_info_json or {},
+            'transactions': transactions,
+            'transaction_count': len(transactions),
+            'raw_text_preview': (statement.raw_text or '')[:500]
+        })
+    elif statement.processing_status == 'failed':
+        response_data['error'] = statement.processing_error
+    return jsonify(response_data), 200
+
 if __name__ == '__main__':
     app.run(debug=True)
 
@@ -0,0 +1,26 @@
+# Gunicorn configuration for the backend API
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+
+# Threaded workers: bcrypt, libpq and file I/O all release the GIL, so a slow
+# request no longer holds up the ones queued behind it. The threads already
+# overlap the waits, so one process per core is enough (2n+1 is for sync workers)
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+
+# Every worker has its own SQLAlchemy pool. A request holds at most one
+# connection, so more threads than pooled connections would only queue on
+# the pool; keep threads at or below DB_POOL_SIZE
+threads = int(os.environ.get('GUNICORN_THREADS', os.environ.get('DB_POOL_SIZE', '8')))
+
+# Import the app once in the master so workers share its pages copy-on-write
+# and start without re-importing everything
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
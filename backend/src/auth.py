@@ -1,14 +1,158 @@
-from flask_jwt_extended import create_access_token
-from werkzeug.security import generate_password_hash, check_password_hash
+import logging
+import uuid
+
+import bcrypt
+import orjson
+import redis
+from flask import current_app
+from flask_jwt_extended import create_access_token, get_jwt_identity
+from sqlalchemy import event
+from werkzeug.security import check_password_hash
+
+from src.models import db, User
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_ROUNDS = 12
+LEGACY_HASH_PREFIXES = ('pbkdf2:', 'scrypt:')
+
+# bcrypt only reads the first 72 bytes of a password: older releases drop the
+# rest silently and newer ones raise, so longer passwords are refused up front
+MAX_PASSWORD_BYTES = 72
+
+USER_CACHE_TTL = 3600
+UNKNOWN_EMAIL_TTL = 5
+
+# Redis is only a cache here: give up quickly on an unreachable server and
+# fall back to the database rather than hanging the request on a TCP connect
+REDIS_TIMEOUT = 0.5
+
+_dummy_hash = None
+_redis_client = None
+
+def password_too_long(password):
+    return len(password.encode('utf-8')) > MAX_PASSWORD_BYTES
 
 def create_hashed_password(password):
-    return generate_password_hash(password)
+    if password_too_long(password):
+        raise ValueError(f'Password is longer than {MAX_PASSWORD_BYTES} bytes')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+def is_legacy_hash(hashed_password):
+    return hashed_password.startswith(LEGACY_HASH_PREFIXES)
 
 def verify_password(hashed_password, password):
-    return check_password_hash(hashed_password, password)
+    if not hashed_password:
+        return False
+    # Hashes created before the switch to bcrypt are still Werkzeug-formatted
+    if is_legacy_hash(hashed_password):
+        return check_password_hash(hashed_password, password)
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+    except ValueError:
+        return False
+
+def _get_dummy_hash():
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = create_hashed_password('dummy-password')
+    return _dummy_hash
 
 def authenticate_user(user, password):
-    if user and verify_password(user.password_hash, password):
+    if user is None:
+        # Spend the same bcrypt time as a real check so unknown emails
+        # can't be told apart from wrong passwords by response time
+        verify_password(_get_dummy_hash(), password)
+        return None
+    if verify_password(user.password_hash, password):
+        if is_legacy_hash(user.password_hash) and not password_too_long(password):
+            # Transparently upgrade the stored hash on successful login; a
+            # password bcrypt can't hold in full keeps its legacy hash
+            user.password_hash = create_hashed_password(password)
+            db.session.commit()
         access_token = create_access_token(identity=user.id)
+        cache_user(user)
         return access_token
     return None
+
+def get_redis():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(
+            current_app.config['REDIS_URL'],
+            socket_connect_timeout=REDIS_TIMEOUT,
+            socket_timeout=REDIS_TIMEOUT,
+        )
+    return _redis_client
+
+def _user_cache_key(user_id):
+    return f'u:{user_id}'
+
+def cache_user(user):
+    """Store the public fields of a user in Redis for authenticated requests"""
+    payload = {'id': str(user.id), 'username': user.username, 'email': user.email}
+    try:
+        get_redis().set(_user_cache_key(user.id), orjson.dumps(payload), ex=USER_CACHE_TTL)
+    except redis.RedisError as e:
+        logger.warning("Could not cache user %s: %s", user.id, e)
+    return payload
+
+def get_current_user():
+    """
+    Get the user behind the current JWT, from Redis when possible
+    
+    Returns:
+        Dictionary with id, username and email, or None if the user no longer exists
+    """
+    user_id = str(get_jwt_identity())
+    try:
+        cached = get_redis().get(_user_cache_key(user_id))
+        if cached:
+            return orjson.loads(cached)
+    except redis.RedisError as e:
+        logger.warning("User cache unavailable: %s", e)
+
+    user = db.session.get(User, uuid.UUID(user_id))
+    if user is None:
+        return None
+    return cache_user(user)
+
+def _unknown_email_key(email):
+    return f'ue:{email}'
+
+def is_unknown_email(email):
+    """Whether /login recently found no user for this email"""
+    try:
+        return bool(get_redis().exists(_unknown_email_key(email)))
+    except redis.RedisError as e:
+        logger.warning("Unknown-email cache unavailable: %s", e)
+        return False
+
+def remember_unknown_email(email):
+    """
+    Remember for a few seconds that no user has this email
+
+    Kept in Redis rather than per process, so a /register on any worker
+    clears it for all of them.
+    """
+    try:
+        get_redis().set(_unknown_email_key(email), 1, ex=UNKNOWN_EMAIL_TTL)
+    except redis.RedisError as e:
+        logger.warning("Could not cache unknown email: %s", e)
+
+def forget_unknown_email(email):
+    try:
+        get_redis().delete(_unknown_email_key(email))
+    except redis.RedisError as e:
+        logger.warning("Could not clear cached unknown email: %s", e)
+
+def invalidate_cached_user(user_id):
+    try:
+        get_redis().delete(_user_cache_key(user_id))
+    except redis.RedisError as e:
+        logger.warning("Could not invalidate cached user %s: %s", user_id, e)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_on_change(mapper, connection, target):
+    invalidate_cached_user(target.id)
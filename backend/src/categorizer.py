@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+
+import ahocorasick
+import redis
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from src.auth import get_redis
+from src.models import TransactionCategory
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bumped in Redis whenever categories change, so every process (API workers
+# and Celery workers alike) rebuilds its automaton, not just the one that
+# made the change. Re-read at most this often, not once per transaction
+VERSION_KEY = 'categories:version'
+VERSION_CHECK_INTERVAL = 5
+
+# (version, automaton) of the last build
+_cached = None
+_automaton_lock = threading.Lock()
+_known_version = 0
+_version_checked_at = float('-inf')
+
+_CHANGED = 'categories_changed'
+
+def build_automaton():
+    """Compile every category keyword into one Aho-Corasick automaton
+
+    Each keyword maps to a (category, subcategory) name pair. When a keyword
+    belongs to both a parent and one of its subcategories, the more specific
+    subcategory wins.
+    """
+    categories = TransactionCategory.query.all()
+    names = {category.id: category.name for category in categories}
+
+    labels = {}
+    for category in categories:
+        if category.parent_id:
+            label = (names.get(category.parent_id), category.name)
+        else:
+            label = (category.name, None)
+        for keyword in category.keywords or []:
+            keyword = keyword.lower()
+            existing = labels.get(keyword)
+            if existing is None or (existing[1] is None and label[1] is not None):
+                labels[keyword] = label
+
+    automaton = ahocorasick.Automaton()
+    for keyword, label in labels.items():
+        automaton.add_word(keyword, label)
+    if labels:
+        automaton.make_automaton()
+    logger.info("Built categorizer with %d keywords", len(labels))
+    return automaton
+
+def current_version():
+    """Categories version shared through Redis (0 until the first change)"""
+    global _known_version, _version_checked_at
+    now = time.monotonic()
+    if now - _version_checked_at >= VERSION_CHECK_INTERVAL:
+        try:
+            _known_version = int(get_redis().get(VERSION_KEY) or 0)
+        except redis.RedisError as e:
+            logger.warning("Categories version unavailable: %s", e)
+        _version_checked_at = now
+    return _known_version
+
+def get_automaton():
+    global _cached
+    version = current_version()
+    cached = _cached
+    if cached is None or cached[0] != version:
+        with _automaton_lock:
+            if _cached is None or _cached[0] != version:
+                _cached = (version, build_automaton())
+            cached = _cached
+    return cached[1]
+
+def invalidate():
+    """Drop the compiled automaton here and have every other process rebuild theirs"""
+    global _cached, _version_checked_at
+    _cached = None
+    _version_checked_at = float('-inf')
+    try:
+        get_redis().incr(VERSION_KEY)
+    except redis.RedisError as e:
+        logger.warning("Could not publish categories change: %s", e)
+
+def classify(description):
+    """
+    Categorize a transaction description in a single pass over its text
+
+    Args:
+        description: Transaction description
+
+    Returns:
+        (category, subcategory) tuple; either may be None
+    """
+    automaton = get_automaton()
+    if not description or len(automaton) == 0:
+        return None, None
+
+    best = None
+    for _, label in automaton.iter(description.lower()):
+        if label[1] is not None:
+            return label
+        if best is None:
+            best = label
+    return best or (None, None)
+
+@event.listens_for(TransactionCategory, 'after_insert')
+@event.listens_for(TransactionCategory, 'after_update')
+@event.listens_for(TransactionCategory, 'after_delete')
+def _invalidate_on_change(mapper, connection, target):
+    # Published once the change is committed, so no process can rebuild
+    # from the old rows and then cache them under the new version
+    session = object_session(target)
+    if session is not None:
+        session.info[_CHANGED] = True
+
+@event.listens_for(Session, 'after_commit')
+def _publish_change(session):
+    if session.info.pop(_CHANGED, False):
+        invalidate()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_change(session):
+    session.info.pop(_CHANGED, None)
@@ -1,9 +1,12 @@
 import os
 from flask import Flask
 from flask_migrate import Migrate
-from sqlalchemy import create_engine, text
+from psycopg2 import errors, sql
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import ProgrammingError
-from models import db, User, BankStatement, Transaction, ProcessingLog, Bank, TransactionCategory
+from src import categorizer
+from src.models import db, User, BankStatement, Transaction, ProcessingLog, Bank, TransactionCategory
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -20,16 +23,30 @@ class DatabaseConfig:
             raise RuntimeError('DATABASE_URL environment variable is not set')
         return db_uri
     
+    @staticmethod
+    def get_engine_options():
+        """Get SQLAlchemy engine/pool options"""
+        return {
+            # Per process; see the connection budget in the README
+            'pool_size': int(os.getenv('DB_POOL_SIZE', '8')),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '2')),
+            'pool_recycle': 3600,
+            'pool_pre_ping': True,
+            # libpq TCP keepalives detect dead connections without a query
+            'connect_args': {
+                'keepalives': 1,
+                'keepalives_idle': 30,
+                'keepalives_interval': 10,
+                'keepalives_count': 5,
+            },
+        }
+    
     @staticmethod
     def init_app(app):
         """Initialize database with Flask app"""
         app.config['SQLALCHEMY_DATABASE_URI'] = DatabaseConfig.get_database_uri()
         app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-            'pool_size': 10,
-            'pool_recycle': 3600,
-            'pool_pre_ping': True,
-        }
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = DatabaseConfig.get_engine_options()
         
         db.init_app(app)
         migrate = Migrate(app, db)
@@ -46,24 +63,17 @@ def create_database():
     # Create connection to postgres default database
     postgres_uri = db_uri.rsplit('/', 1)[0] + '/postgres'
     
-    engine = create_engine(postgres_uri)
+    engine = create_engine(postgres_uri, isolation_level='AUTOCOMMIT')
     conn = engine.connect()
     
     try:
-        # Check if database exists
-        conn.execute(text("COMMIT"))
-        exists = conn.execute(
-            text(f"SELECT 1 FROM pg_database WHERE datname = '{db_name}'")
-        ).fetchone()
-        
-        if not exists:
-            # Create database
-            conn.execute(text("COMMIT"))
-            conn.execute(text(f"CREATE DATABASE {db_name}"))
-            logger.info(f"Database '{db_name}' created successfully")
-        else:
-            logger.info(f"Database '{db_name}' already exists")
-            
+        # Attempt the CREATE directly rather than checking pg_database first,
+        # which avoids a second round trip and the check-then-create race
+        with conn.connection.cursor() as cur:
+            cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(db_name)))
+        logger.info(f"Database '{db_name}' created successfully")
+    except errors.DuplicateDatabase:
+        logger.info(f"Database '{db_name}' already exists")
     except Exception as e:
         logger.error(f"Error creating database: {e}")
     finally:
@@ -93,7 +103,8 @@ def seed_initial_data():
                 'account_number': r'Account Number:?\s*(\d+)',
                 'balance': r'Balance:?\s*\$?([\d,]+\.?\d*)',
                 'transaction': r'(\d{2}/\d{2}/\d{4})\s+(.*?)\s+\$?([\d,]+\.?\d*)'
-            }
+            },
+            'config_json': {'requires_ocr': True, 'supported_formats': ['pdf', 'jpg', 'png']}
         },
         {
             'name': 'Chase Bank',
@@ -103,7 +114,8 @@ def seed_initial_data():
                 'account_number': r'Account:?\s*(\d+)',
                 'balance': r'Balance:?\s*\$?([\d,]+\.?\d*)',
                 'transaction': r'(\d{2}/\d{2}/\d{4})\s+(.*?)\s+\$?([\d,]+\.?\d*)'
-            }
+            },
+            'config_json': {'requires_ocr': True, 'supported_formats': ['pdf', 'jpg', 'png']}
         },
         {
             'name': 'Wells Fargo',
@@ -113,16 +125,17 @@ def seed_initial_data():
                 'account_number': r'Account\s*#?:?\s*(\d+)',
                 'balance': r'Balance:?\s*\$?([\d,]+\.?\d*)',
                 'transaction': r'(\d{2}/\d{2}/\d{4})\s+(.*?)\s+\$?([\d,]+\.?\d*)'
+            },
+            # Often uploaded as phone photos: straighten and even out the
+            # lighting before binarizing
+            'config_json': {
+                'requires_ocr': True,
+                'supported_formats': ['pdf', 'jpg', 'png'],
+                'preprocess': ['deskew', 'upscale', 'equalize', 'otsu']
             }
         }
     ]
     
-    for bank_data in banks_data:
-        bank = Bank.query.filter_by(code=bank_data['code']).first()
-        if not bank:
-            bank = Bank(**bank_data)
-            db.session.add(bank)
-    
     # Seed transaction categories
     categories_data = [
         {
@@ -222,27 +235,47 @@ def seed_initial_data():
         }
     ]
     
-    for cat_data in categories_data:
-        parent_cat = TransactionCategory.query.filter_by(name=cat_data['name']).first()
-        if not parent_cat:
-            subcategories = cat_data.pop('subcategories', [])
-            parent_cat = TransactionCategory(**cat_data)
-            db.session.add(parent_cat)
-            db.session.flush()  # Get parent ID
-            
-            # Add subcategories
-            for subcat_data in subcategories:
-                subcat = TransactionCategory(
-                    name=subcat_data['name'],
-                    parent_id=parent_cat.id,
-                    keywords=subcat_data['keywords'],
-                    color=cat_data['color'],
-                    icon=cat_data['icon']
-                )
-                db.session.add(subcat)
-    
     try:
+        # Existing rows are left untouched, so seeding is safe to re-run.
+        # A multi-row VALUES insert takes its columns from the first row, so
+        # every bank dict above must carry the same keys
+        db.session.execute(insert(Bank).values(banks_data).on_conflict_do_nothing())
+        
+        parent_rows = [
+            {key: value for key, value in cat_data.items() if key != 'subcategories'}
+            for cat_data in categories_data
+        ]
+        inserted_parents = db.session.execute(
+            insert(TransactionCategory)
+            .values(parent_rows)
+            .on_conflict_do_nothing(index_elements=['name'])
+            .returning(TransactionCategory.id, TransactionCategory.name)
+        ).all()
+        parent_ids = {name: parent_id for parent_id, name in inserted_parents}
+        
+        # Only newly created parents get their subcategories seeded
+        subcategory_rows = [
+            {
+                'name': subcat_data['name'],
+                'parent_id': parent_ids[cat_data['name']],
+                'keywords': subcat_data['keywords'],
+                'color': cat_data['color'],
+                'icon': cat_data['icon']
+            }
+            for cat_data in categories_data
+            if cat_data['name'] in parent_ids
+            for subcat_data in cat_data.get('subcategories', [])
+        ]
+        if subcategory_rows:
+            db.session.execute(
+                insert(TransactionCategory)
+                .values(subcategory_rows)
+                .on_conflict_do_nothing(index_elements=['name'])
+            )
+        
         db.session.commit()
+        # Core inserts don't fire the ORM events that refresh the categorizer
+        categorizer.invalidate()
         logger.info("Initial data seeded successfully")
     except Exception as e:
         db.session.rollback()
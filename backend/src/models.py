@@ -1,11 +1,32 @@
 from flask_sqlalchemy import SQLAlchemy
+from collections import defaultdict
 from datetime import datetime
 import json
+from sqlalchemy import event, select, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
+from decimal import Decimal, ROUND_HALF_UP
 import uuid
 
 db = SQLAlchemy()
 
+class Cents(db.TypeDecorator):
+    """Money stored as integer cents
+
+    Values read back are plain ints. Decimals (in whole currency units)
+    are accepted on write and converted, so callers parsing amounts from
+    text don't have to do the scaling themselves.
+    """
+    impl = db.BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, Decimal):
+            return int((value * 100).to_integral_value(rounding=ROUND_HALF_UP))
+        return value
+
+def cents_to_units(value):
+    return value / 100 if value is not None else None
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -13,19 +34,30 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
+    statement_count = db.Column(db.Integer, nullable=False, default=0)  # Maintained by BankStatement insert/delete events
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    statements = db.relationship('BankStatement', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    statements = db.relationship('BankStatement', backref='user', lazy='select', cascade='all, delete-orphan')
+    
+    def get_statements(self, page=1, per_page=20):
+        """Get one page of this user's statements, newest first"""
+        return db.session.scalars(
+            select(BankStatement)
+            .where(BankStatement.user_id == self.id)
+            .order_by(BankStatement.uploaded_at.desc())
+            .limit(per_page)
+            .offset((page - 1) * per_page)
+        ).all()
     
     def to_dict(self):
         return {
-            'id': str(self.id),
+            'id': self.id,
             'username': self.username,
             'email': self.email,
-            'created_at': self.created_at.isoformat(),
-            'statement_count': self.statements.count()
+            'created_at': self.created_at,
+            'statement_count': self.statement_count
         }
 
 class BankStatement(db.Model):
@@ -47,17 +79,18 @@ class BankStatement(db.Model):
     statement_period_start = db.Column(db.Date)
     statement_period_end = db.Column(db.Date)
     
-    # Balance information
-    opening_balance = db.Column(db.Numeric(12, 2))
-    closing_balance = db.Column(db.Numeric(12, 2))
-    total_credits = db.Column(db.Numeric(12, 2))
-    total_debits = db.Column(db.Numeric(12, 2))
+    # Balance information (integer cents)
+    opening_balance = db.Column(Cents)
+    closing_balance = db.Column(Cents)
+    total_credits = db.Column(Cents)
+    total_debits = db.Column(Cents)
     
     # Metadata
     raw_text = db.Column(db.Text)
     account_info_json = db.Column(JSONB)  # Store additional account info as JSON
     processing_status = db.Column(db.String(50), default='pending')  # pending, processing, completed, failed
     processing_error = db.Column(db.Text)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)  # Maintained by Transaction insert/delete events
     
     # Timestamps
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -66,12 +99,17 @@ class BankStatement(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    transactions = db.relationship('Transaction', backref='statement', lazy='dynamic', cascade='all, delete-orphan')
+    transactions = db.relationship('Transaction', backref='statement', lazy='select', cascade='all, delete-orphan')
+    
+    # Indexes
+    __table_args__ = (
+        db.Index('idx_statements_user_uploaded', 'user_id', db.text('uploaded_at DESC')),
+    )
     
     def to_dict(self):
         return {
-            'id': str(self.id),
-            'user_id': str(self.user_id),
+            'id': self.id,
+            'user_id': self.user_id,
             'original_filename': self.original_filename,
             'file_size': self.file_size,
             'file_type': self.file_type,
@@ -79,20 +117,20 @@ class BankStatement(db.Model):
             'account_holder_name': self.account_holder_name,
             'bank_name': self.bank_name,
             'statement_period': {
-                'start': self.statement_period_start.isoformat() if self.statement_period_start else None,
-                'end': self.statement_period_end.isoformat() if self.statement_period_end else None
+                'start': self.statement_period_start,
+                'end': self.statement_period_end
             },
             'balances': {
-                'opening': float(self.opening_balance) if self.opening_balance else None,
-                'closing': float(self.closing_balance) if self.closing_balance else None,
-                'total_credits': float(self.total_credits) if self.total_credits else None,
-                'total_debits': float(self.total_debits) if self.total_debits else None
+                'opening': cents_to_units(self.opening_balance),
+                'closing': cents_to_units(self.closing_balance),
+                'total_credits': cents_to_units(self.total_credits),
+                'total_debits': cents_to_units(self.total_debits)
             },
             'account_info': self.account_info_json,
             'processing_status': self.processing_status,
-            'transaction_count': self.transactions.count(),
-            'uploaded_at': self.uploaded_at.isoformat(),
-            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+            'transaction_count': self.transaction_count,
+            'uploaded_at': self.uploaded_at,
+            'processed_at': self.processed_at
         }
 
 class Transaction(db.Model):
@@ -107,10 +145,10 @@ class Transaction(db.Model):
     description = db.Column(db.Text)
     reference_number = db.Column(db.String(100))
     
-    # Amount information
-    amount = db.Column(db.Numeric(12, 2), nullable=False)
+    # Amount information (integer cents)
+    amount = db.Column(Cents, nullable=False)
     transaction_type = db.Column(db.String(20))  # credit, debit
-    balance = db.Column(db.Numeric(12, 2))
+    balance = db.Column(Cents)
     
     # Categorization
     category = db.Column(db.String(100))
@@ -134,22 +172,24 @@ class Transaction(db.Model):
     # Indexes
     __table_args__ = (
         db.Index('idx_transaction_date', 'transaction_date'),
-        db.Index('idx_amount', 'amount'),
         db.Index('idx_category', 'category'),
-        db.Index('idx_statement_date', 'statement_id', 'transaction_date'),
+        db.Index('idx_statement_date', 'statement_id', 'transaction_date',
+                 postgresql_include=['amount', 'description']),
+        db.Index('idx_tx_statement_type', 'statement_id', 'transaction_type',
+                 postgresql_include=['amount']),
     )
     
     def to_dict(self):
         return {
-            'id': str(self.id),
-            'statement_id': str(self.statement_id),
-            'transaction_date': self.transaction_date.isoformat() if self.transaction_date else None,
-            'posting_date': self.posting_date.isoformat() if self.posting_date else None,
+            'id': self.id,
+            'statement_id': self.statement_id,
+            'transaction_date': self.transaction_date,
+            'posting_date': self.posting_date,
             'description': self.description,
             'reference_number': self.reference_number,
-            'amount': float(self.amount) if self.amount else None,
+            'amount': cents_to_units(self.amount),
             'transaction_type': self.transaction_type,
-            'balance': float(self.balance) if self.balance else None,
+            'balance': cents_to_units(self.balance),
             'category': self.category,
             'subcategory': self.subcategory,
             'merchant_name': self.merchant_name,
@@ -158,9 +198,32 @@ class Transaction(db.Model):
             'is_pending': self.is_pending,
             'is_flagged': self.is_flagged,
             'flag_reason': self.flag_reason,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
 
+def _adjust_count(connection, table, column, row_id, delta):
+    connection.execute(
+        table.update()
+        .where(table.c.id == row_id)
+        .values({column: table.c[column] + delta})
+    )
+
+@event.listens_for(BankStatement, 'after_insert')
+def _increment_statement_count(mapper, connection, target):
+    _adjust_count(connection, User.__table__, 'statement_count', target.user_id, 1)
+
+@event.listens_for(BankStatement, 'after_delete')
+def _decrement_statement_count(mapper, connection, target):
+    _adjust_count(connection, User.__table__, 'statement_count', target.user_id, -1)
+
+@event.listens_for(Transaction, 'after_insert')
+def _increment_transaction_count(mapper, connection, target):
+    _adjust_count(connection, BankStatement.__table__, 'transaction_count', target.statement_id, 1)
+
+@event.listens_for(Transaction, 'after_delete')
+def _decrement_transaction_count(mapper, connection, target):
+    _adjust_count(connection, BankStatement.__table__, 'transaction_count', target.statement_id, -1)
+
 class ProcessingLog(db.Model):
     __tablename__ = 'processing_logs'
     
@@ -183,14 +246,14 @@ class ProcessingLog(db.Model):
     
     def to_dict(self):
         return {
-            'id': str(self.id),
-            'statement_id': str(self.statement_id) if self.statement_id else None,
+            'id': self.id,
+            'statement_id': self.statement_id,
             'action': self.action,
             'status': self.status,
             'message': self.message,
             'details': self.details_json,
             'processing_time_ms': self.processing_time_ms,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
 
 class Bank(db.Model):
@@ -214,7 +277,7 @@ class Bank(db.Model):
     
     def to_dict(self):
         return {
-            'id': str(self.id),
+            'id': self.id,
             'name': self.name,
             'code': self.code,
             'date_format': self.date_format,
@@ -245,14 +308,36 @@ class TransactionCategory(db.Model):
     # Self-referential relationship for subcategories
     subcategories = db.relationship('TransactionCategory', backref=db.backref('parent', remote_side=[id]))
     
-    def to_dict(self):
+    def to_dict(self, subcategories=None):
         return {
-            'id': str(self.id),
+            'id': self.id,
             'name': self.name,
-            'parent_id': str(self.parent_id) if self.parent_id else None,
+            'parent_id': self.parent_id,
             'keywords': self.keywords,
             'rules': self.rules_json,
             'color': self.color,
             'icon': self.icon,
-            'subcategories': [sub.to_dict() for sub in self.subcategories]
-        }
\ No newline at end of file
+            'subcategories': subcategories or []
+        }
+    
+    @classmethod
+    def tree_dict(cls):
+        """Serialize the whole category tree, fetched with a single recursive query"""
+        tree_query = text("""
+            WITH RECURSIVE cat AS (
+                SELECT * FROM transaction_categories WHERE parent_id IS NULL
+                UNION ALL
+                SELECT c.* FROM transaction_categories c JOIN cat ON c.parent_id = cat.id
+            )
+            SELECT * FROM cat
+        """)
+        categories = db.session.execute(select(cls).from_statement(tree_query)).scalars().all()
+        
+        children = defaultdict(list)
+        for category in categories:
+            children[category.parent_id].append(category)
+        
+        def build(category):
+            return category.to_dict([build(sub) for sub in children[category.id]])
+        
+        return [build(root) for root in children[None]]
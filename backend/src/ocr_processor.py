@@ -1,136 +1,432 @@
-import pytesseract
-from pytesseract import TesseractError
+import os
+
+# Pages are parallelized across threads, one engine each, so keep every
+# Tesseract engine single-threaded to avoid oversubscribing the cores.
+# This must be set before libtesseract's OpenMP runtime is loaded.
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+from tesserocr import PyTessBaseAPI, PSM, OEM, RIL, iterate_level
 from PIL import Image
+import cv2
+try:
+    import pyvips
+except (ImportError, OSError):  # pyvips is optional and needs libvips installed
+    pyvips = None
+import numpy as np
 import pdf2image
 from pdf2image.exceptions import PDFInfoNotInstalledError, PDFPageCountError
+from cachetools import LRUCache, cached
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+import csv
+import hashlib
 import re
+import tempfile
 import pandas as pd
 from datetime import datetime
-import os
+import threading
+import weakref
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Compiled once at import and shared by every parse.
+# An amount has exactly one way to match: either comma-grouped thousands or
+# a plain run of digits, then two decimals. The old \d+[,.]?\d*\.?\d{2}
+# could split the same digits several ways and backtracked through each
+_AMOUNT = r'(?:\d{1,3}(?:,\d{3})+|\d+)\.\d{2}'
+
+# A transaction is a date, a description and an amount on the same line.
+# The amount may carry a currency symbol and a sign, either leading ("-12.00",
+# "$45.10") or trailing ("100.00-", "100.00 DR"); debits come out negative
+_TXN_RE = re.compile(
+    r'(?<!\d)(?P<date>\d{2}[/-]\d{2}[/-]\d{2,4})[ \t]+(?P<desc>.*?)[ \t]+'
+    r'(?P<sign>[-+])?\$?(?P<amount>' + _AMOUNT + r')(?P<suffix>-|[ \t]?[CD]R)?(?=[ \t]|$)',
+    re.MULTILINE
+)
+
+_ACCOUNT_PATTERNS = {
+    key: re.compile(pattern, re.IGNORECASE)
+    for key, pattern in {
+        'account_number': r'[Aa]ccount\s*[Nn]o\.?\s*:?\s*(\d+)',
+        'statement_period': r'[Ss]tatement\s*[Pp]eriod\s*:?\s*(.*?to.*?\d{4})',
+        'opening_balance': r'[Oo]pening\s*[Bb]alance\s*:?\s*(-)?\$?(' + _AMOUNT + r')(?!\d)',
+        'closing_balance': r'[Cc]losing\s*[Bb]alance\s*:?\s*(-)?\$?(' + _AMOUNT + r')(?!\d)',
+        # The name stays on its own line rather than running into the next ones
+        'customer_name': r'[Nn]ame[ \t]*:?[ \t]*([A-Z][A-Za-z \t]*[A-Za-z])',
+    }.items()
+}
+
+# Columns of a parsed transaction, in CSV output order. The full source
+# line is only kept on request, since it roughly doubles each row's size
+TRANSACTION_FIELDS = ['date', 'amount', 'description']
+RAW_TRANSACTION_FIELDS = TRANSACTION_FIELDS + ['raw_line']
+
+# Images narrower than this are upscaled before OCR. Rendered PDF pages
+# (300 dpi, ~2550 px wide for Letter) never need it
+UPSCALE_BELOW_WIDTH = 1500
+UPSCALE_TARGET_WIDTH = 2000
+
+_CV2_GRAY_CONVERSIONS = {
+    'RGB': cv2.COLOR_RGB2GRAY,
+    'RGBA': cv2.COLOR_RGBA2GRAY,
+}
+
+# Preprocessing steps, each taking and returning a 2-D uint8 grayscale array
+def _upscale(pixels):
+    # OpenCV's resize is SIMD-vectorized. Going past ~2x adds pixels for
+    # Tesseract without improving accuracy
+    height, width = pixels.shape
+    if width >= UPSCALE_BELOW_WIDTH:
+        return pixels
+    new_width = min(UPSCALE_TARGET_WIDTH, width * 2)
+    new_height = int(height * (new_width / width))
+    return cv2.resize(pixels, (new_width, new_height), interpolation=cv2.INTER_LANCZOS4)
+
+def _equalize(pixels):
+    # Stretch the contrast of faded or low-contrast scans
+    return cv2.equalizeHist(pixels)
+
+def _deskew(pixels):
+    # Estimate the skew from the smallest rectangle around the dark (ink) pixels
+    _, ink = cv2.threshold(pixels, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    points = cv2.findNonZero(ink)
+    if points is None:
+        return pixels
+    # Fold the angle into (-45, 45]; OpenCV versions disagree on its range
+    angle = cv2.minAreaRect(points)[-1]
+    if angle > 45:
+        angle -= 90
+    elif angle <= -45:
+        angle += 90
+    if abs(angle) < 0.1:
+        return pixels
+    height, width = pixels.shape
+    rotation = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(pixels, rotation, (width, height),
+                          flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+def _otsu(pixels):
+    # Binarize up front; Tesseract would otherwise run its own thresholding
+    # pass over the grayscale image
+    _, pixels = cv2.threshold(pixels, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return pixels
+
+PREPROCESS_STEPS = {
+    'deskew': _deskew,
+    'upscale': _upscale,
+    'equalize': _equalize,
+    'otsu': _otsu,
+}
+
+# Pipeline used unless a bank profile asks for something else
+DEFAULT_PIPELINE = ('upscale', 'otsu')
+
+@lru_cache(maxsize=None)
+def build_pipeline(steps):
+    """
+    Compile a sequence of preprocessing step names into a single callable
+    
+    Each distinct tuple of steps is resolved once and reused for every page.
+    
+    Args:
+        steps: Tuple of names from PREPROCESS_STEPS, applied in order
+    
+    Returns:
+        Function mapping a grayscale uint8 array to the preprocessed array
+    """
+    unknown = [step for step in steps if step not in PREPROCESS_STEPS]
+    if unknown:
+        raise ValueError(f"Unknown preprocessing steps: {', '.join(unknown)}")
+    functions = tuple(PREPROCESS_STEPS[step] for step in steps)
+    
+    def pipeline(pixels):
+        for function in functions:
+            pixels = function(pixels)
+        return pixels
+    
+    return pipeline
+
+# OCR lines Tesseract is less confident about than this (0-100) are treated
+# as noise (stamps, marginalia, smudges) and never reach the parsers
+MIN_LINE_CONFIDENCE = 40
+
+# Number of distinct texts whose parse results are kept
+PARSE_CACHE_SIZE = 64
+
+def _text_key(text):
+    # Key the caches by a short digest rather than holding on to whole pages
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+@cached(LRUCache(maxsize=PARSE_CACHE_SIZE), key=_text_key, lock=threading.Lock())
+def _match_transactions(text):
+    # Results are cached, so they are returned as tuples that callers can't mutate
+    rows = []
+    for match in _TXN_RE.finditer(text):
+        line_start = text.rfind('\n', 0, match.start()) + 1
+        line_end = text.find('\n', match.end())
+        suffix = (match['suffix'] or '').strip()
+        negative = match['sign'] == '-' or suffix in ('-', 'DR')
+        rows.append((
+            match['date'],
+            ('-' if negative else '') + match['amount'].replace(',', ''),
+            match['desc'].strip(),
+            text[line_start:line_end if line_end != -1 else len(text)]
+        ))
+    return tuple(rows)
+
+@cached(LRUCache(maxsize=PARSE_CACHE_SIZE), key=_text_key, lock=threading.Lock())
+def _match_account_info(text):
+    fields = []
+    for key, pattern in _ACCOUNT_PATTERNS.items():
+        match = pattern.search(text)
+        if match:
+            # Balances capture their sign separately from the digits
+            fields.append((key, ''.join(group for group in match.groups() if group).strip()))
+    return tuple(fields)
+
 class BankStatementOCR:
-    def __init__(self, tesseract_cmd=None):
+    def __init__(self, tessdata_path=None, lang='eng', max_workers=None, pdf_backend='pdf2image',
+                 pipeline=DEFAULT_PIPELINE, min_confidence=MIN_LINE_CONFIDENCE):
         """
         Initialize the Bank Statement OCR processor
         
+        Each worker thread loads its own Tesseract engine once and reuses it
+        for every page, instead of paying the model initialization cost per call.
+        
         Args:
-            tesseract_cmd: Path to tesseract executable (if not in PATH)
+            tessdata_path: Path to the tessdata directory (if not the default)
+            lang: Tesseract language model to load
+            max_workers: Number of pages to OCR concurrently
+                (defaults to one single-threaded engine per core, which
+                assumes one processor per host; run Celery with --concurrency=1)
+            pdf_backend: 'pdf2image' (pdftoppm) or 'pyvips' (libvips pdfload)
+            pipeline: Default preprocessing steps, names from PREPROCESS_STEPS
+            min_confidence: Drop OCR lines below this mean confidence
+                (0 keeps every line)
         """
-        if tesseract_cmd:
-            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        if pdf_backend not in ('pdf2image', 'pyvips'):
+            raise ValueError(f"Unknown PDF backend: {pdf_backend}")
+        if pdf_backend == 'pyvips' and pyvips is None:
+            raise RuntimeError("pdf_backend='pyvips' requires pyvips and libvips")
+        self.pdf_backend = pdf_backend
+        # Resolve the pipeline now so a bad step name fails at startup
+        build_pipeline(tuple(pipeline))
+        self.pipeline = tuple(pipeline)
+        self.min_confidence = min_confidence
+        self.api_kwargs = {'lang': lang, 'psm': PSM.SINGLE_BLOCK, 'oem': OEM.DEFAULT}
+        if tessdata_path:
+            self.api_kwargs['path'] = tessdata_path
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        self.max_workers = max_workers
+        self._init_engines()
+        
+        # Threads and engine handles don't survive fork(), so a processor
+        # created before a preforking server forks starts fresh in each child
+        processor = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: processor() and processor()._init_engines())
+    
+    def _init_engines(self):
+        # Tesseract releases the GIL, so pages are OCR'd concurrently on a
+        # long-lived pool whose threads keep their engines between requests
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ocr')
+        # A PyTessBaseAPI handle is not safe to share between threads
+        self._local = threading.local()
+        self._apis = []
+        self._apis_lock = threading.Lock()
     
-    def pdf_to_images(self, pdf_path, dpi=300):
+    def warm_up(self):
+        """Load a Tesseract engine on every pool thread ahead of the first page"""
+        # The barrier holds each thread until all have loaded, so no thread
+        # picks up a second task and every pool thread gets its own engine
+        barrier = threading.Barrier(self.max_workers)
+        
+        def load(_):
+            try:
+                api = self.api
+            except RuntimeError:
+                barrier.abort()
+                raise
+            barrier.wait()
+            return api
+        
+        list(self._executor.map(load, range(self.max_workers)))
+        logger.info("Loaded %d Tesseract engines", self.max_workers)
+    
+    @property
+    def api(self):
+        """Tesseract engine owned by the calling thread"""
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            api = PyTessBaseAPI(**self.api_kwargs)
+            self._local.api = api
+            with self._apis_lock:
+                self._apis.append(api)
+        return api
+    
+    def close(self):
+        """Shut down the worker pool and release every Tesseract engine"""
+        self._executor.shutdown(wait=True)
+        with self._apis_lock:
+            for api in self._apis:
+                api.End()
+            self._apis.clear()
+    
+    def pdf_to_images(self, pdf_path, dpi=300, thread_count=None, output_folder=None):
         """
         Convert PDF pages to images
         
         Args:
             pdf_path: Path to the PDF file
             dpi: Resolution for conversion
+            thread_count: Number of pdftoppm processes rendering page ranges
+                in parallel (defaults to all but one core)
+            output_folder: Directory to render pages into; when given, page
+                file paths are returned instead of in-memory images
         
         Returns:
-            List of PIL Image objects
+            List of grayscale PIL Image objects, or page file paths
         """
+        if self.pdf_backend == 'pyvips':
+            return self._pdf_to_images_vips(pdf_path, dpi)
+        
+        if thread_count is None:
+            thread_count = max(1, (os.cpu_count() or 1) - 1)
         try:
-            images = pdf2image.convert_from_path(pdf_path, dpi=dpi)
+            # Let pdftoppm render grayscale directly instead of converting RGB pages afterwards
+            images = pdf2image.convert_from_path(
+                pdf_path,
+                dpi=dpi,
+                thread_count=thread_count,
+                grayscale=True,
+                output_folder=output_folder,
+                paths_only=output_folder is not None
+            )
             logger.info("Converted %d pages from PDF %s", len(images), pdf_path)
             return images
         except (PDFInfoNotInstalledError, PDFPageCountError, FileNotFoundError) as e:
             logger.error("Error converting PDF %s: %s", pdf_path, e)
             return []
     
-    def preprocess_image(self, image):
+    def _pdf_to_images_vips(self, pdf_path, dpi):
+        """
+        Render all PDF pages with a single libvips pdfload call
+        
+        libvips evaluates lazily, so each page strip is only rendered when
+        its pixels are pulled out of the pipeline.
+        
+        Returns:
+            List of grayscale PIL Image objects
+        """
+        try:
+            document = pyvips.Image.pdfload(pdf_path, n=-1, dpi=dpi)
+            page_height = document.get('page-height') if document.get_typeof('page-height') else document.height
+            # Drop the alpha band and fuse the grayscale conversion into the render
+            document = document.flatten(background=255).colourspace('b-w')
+            
+            images = []
+            for top in range(0, document.height, page_height):
+                page = document.crop(0, top, document.width, page_height)
+                images.append(Image.frombuffer('L', (page.width, page.height), page.write_to_memory(), 'raw', 'L', 0, 1))
+            logger.info("Converted %d pages from PDF %s", len(images), pdf_path)
+            return images
+        except pyvips.Error as e:
+            logger.error("Error converting PDF %s: %s", pdf_path, e)
+            return []
+    
+    def preprocess_image(self, image, upscale=True, pipeline=None):
         """
         Preprocess image for better OCR accuracy
         
         Args:
             image: PIL Image object
+            upscale: Whether low-resolution images may be enlarged; pass
+                False when the resolution was already chosen upstream
+            pipeline: Tuple of PREPROCESS_STEPS names to run after the
+                grayscale conversion (defaults to the processor's pipeline)
         
         Returns:
-            Preprocessed PIL Image
+            Preprocessed black-and-white image as a contiguous uint8 numpy array
         """
-        # Convert to grayscale
-        image = image.convert('L')
+        # Convert to grayscale (already the case for rendered PDF pages)
+        if image.mode == 'L':
+            pixels = np.asarray(image)
+        elif image.mode in _CV2_GRAY_CONVERSIONS:
+            pixels = cv2.cvtColor(np.asarray(image), _CV2_GRAY_CONVERSIONS[image.mode])
+        else:
+            pixels = np.asarray(image.convert('L'))
         
-        # Optionally resize for better OCR
-        width, height = image.size
-        if width < 2000:
-            new_width = 2000
-            new_height = int(height * (new_width / width))
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        steps = pipeline or self.pipeline
+        if not upscale:
+            steps = tuple(step for step in steps if step != 'upscale')
+        pixels = build_pipeline(steps)(pixels)
         
-        return image
+        return np.ascontiguousarray(pixels, dtype=np.uint8)
     
-    def extract_text(self, image):
+    def extract_text(self, image, upscale=True, pipeline=None):
         """
         Extract text from image using OCR
         
         Args:
             image: PIL Image object or path to image
+            upscale: Whether low-resolution images may be enlarged
+            pipeline: Preprocessing steps to run (see preprocess_image)
         
         Returns:
-            Extracted text string
+            Extracted text string, one line per OCR text line, without the
+            lines recognized below min_confidence
         """
         try:
-            # Preprocess if it's an image object
-            if isinstance(image, Image.Image):
-                image = self.preprocess_image(image)
-
-            # OCR configuration for better accuracy
-            custom_config = r'--oem 3 --psm 6'
-            text = pytesseract.image_to_string(image, config=custom_config)
-            return text
-        except (TesseractError, OSError) as e:
+            # Load from disk if given a path
+            if not isinstance(image, Image.Image):
+                image = Image.open(image)
+            pixels = self.preprocess_image(image, upscale=upscale, pipeline=pipeline)
+            height, width = pixels.shape
+
+            # Hand the raw 8-bit buffer to Tesseract, skipping PIL's encode/decode
+            api = self.api
+            api.SetImageBytes(pixels.tobytes(), width, height, 1, width)
+            if not self.min_confidence:
+                return api.GetUTF8Text()
+            return self._confident_text(api)
+        except (RuntimeError, OSError) as e:
             logger.error("Error during OCR: %s", e)
             return ""
     
-    def parse_transactions(self, text):
+    def _confident_text(self, api):
+        """Recognize the current image and keep only its confident lines"""
+        api.Recognize()
+        iterator = api.GetIterator()
+        if iterator is None:
+            return ""
+        
+        lines = []
+        for line in iterate_level(iterator, RIL.TEXTLINE):
+            if line.Confidence(RIL.TEXTLINE) < self.min_confidence:
+                continue
+            text = line.GetUTF8Text(RIL.TEXTLINE)
+            if text:
+                lines.append(text.rstrip('\n'))
+        return "\n".join(lines)
+    
+    def parse_transactions(self, text, keep_raw=False):
         """
         Parse transaction data from extracted text
         
         Args:
             text: OCR extracted text
+            keep_raw: Include each transaction's full source line as 'raw_line'
         
         Returns:
             List of transaction dictionaries
         """
-        transactions = []
-        
-        # Common patterns for transaction lines
-        # Adjust these patterns based on your bank's statement format
-        patterns = {
-            'date_amount': r'(\d{2}[/-]\d{2}[/-]\d{2,4})\s+.*?\s+(\d+[,.]?\d*\.?\d{2})',
-            'description': r'\d{2}[/-]\d{2}[/-]\d{2,4}\s+(.*?)\s+\d+[,.]?\d*\.?\d{2}',
-            'balance': r'[Bb]alance.*?(\d+[,.]?\d*\.?\d{2})',
-        }
-        
-        lines = text.split('\n')
-        
-        for line in lines:
-            # Try to match transaction pattern
-            date_match = re.search(r'(\d{2}[/-]\d{2}[/-]\d{2,4})', line)
-            amount_match = re.search(r'(\d+[,.]?\d*\.?\d{2})(?:\s|$)', line)
-            
-            if date_match and amount_match:
-                transaction = {
-                    'date': date_match.group(1),
-                    'amount': amount_match.group(1).replace(',', ''),
-                    'description': line.strip(),
-                    'raw_line': line
-                }
-                
-                # Try to extract description between date and amount
-                desc_pattern = f"{re.escape(date_match.group(1))}\s+(.*?)\s+{re.escape(amount_match.group(1))}"
-                desc_match = re.search(desc_pattern, line)
-                if desc_match:
-                    transaction['description'] = desc_match.group(1).strip()
-                
-                transactions.append(transaction)
-        
-        return transactions
+        # One scan over the whole text instead of splitting it and searching
+        # line by line, skipped entirely when the same text was parsed recently.
+        # zip() stops at the shorter sequence, dropping raw_line unless asked for
+        fields = RAW_TRANSACTION_FIELDS if keep_raw else TRANSACTION_FIELDS
+        return [dict(zip(fields, row)) for row in _match_transactions(text)]
     
     def extract_account_info(self, text):
         """
@@ -142,52 +438,44 @@ class BankStatementOCR:
         Returns:
             Dictionary with account information
         """
-        info = {}
-        
-        # Pattern matching for common account info
-        patterns = {
-            'account_number': r'[Aa]ccount\s*[Nn]o\.?\s*:?\s*(\d+)',
-            'statement_period': r'[Ss]tatement\s*[Pp]eriod\s*:?\s*(.*?to.*?\d{4})',
-            'opening_balance': r'[Oo]pening\s*[Bb]alance\s*:?\s*(\d+[,.]?\d*\.?\d{2})',
-            'closing_balance': r'[Cc]losing\s*[Bb]alance\s*:?\s*(\d+[,.]?\d*\.?\d{2})',
-            'customer_name': r'[Nn]ame\s*:?\s*([A-Z][A-Za-z\s]+)',
-        }
-        
-        for key, pattern in patterns.items():
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                info[key] = match.group(1).strip()
-        
-        return info
+        return dict(_match_account_info(text))
     
-    def process_statement(self, file_path, output_format='dataframe'):
+    def process_statement(self, file_path, output_format='dataframe', pipeline=None, keep_raw=False):
         """
         Process a complete bank statement
         
         Args:
             file_path: Path to the statement file (PDF or image)
             output_format: 'dataframe', 'dict', or 'csv'
+            pipeline: Preprocessing steps for this statement's bank, if it
+                needs something other than the processor's default
+            keep_raw: Include each transaction's source line as 'raw_line'
         
         Returns:
             Processed data in specified format
         """
-        all_text = ""
         all_transactions = []
         
         # Check if it's a PDF or image
         if file_path.lower().endswith('.pdf'):
-            images = self.pdf_to_images(file_path)
-            for i, image in enumerate(images):
-                logger.info("Processing page %d", i + 1)
-                text = self.extract_text(image)
-                all_text += text + "\n"
-                transactions = self.parse_transactions(text)
-                all_transactions.extend(transactions)
+            # Pages are spilled to disk and loaded one at a time by the OCR
+            # workers, rather than holding every 300 dpi page in memory at once
+            page_texts = []
+            with tempfile.TemporaryDirectory(prefix='ocr_pages_') as pages_dir:
+                pages = self.pdf_to_images(file_path, output_folder=pages_dir)
+                logger.info("Processing %d pages with %d workers", len(pages), self.max_workers)
+                # map() yields in page order, so the text is reassembled correctly
+                # Pages are rendered at a fixed dpi, so they are never upscaled
+                for text in self._executor.map(partial(self.extract_text, upscale=False, pipeline=pipeline), pages):
+                    page_texts.append(text)
+                    transactions = self.parse_transactions(text, keep_raw=keep_raw)
+                    all_transactions.extend(transactions)
+            all_text = "\n".join(page_texts)
         else:
             # Process as image
             image = Image.open(file_path)
-            all_text = self.extract_text(image)
-            all_transactions = self.parse_transactions(all_text)
+            all_text = self.extract_text(image, pipeline=pipeline)
+            all_transactions = self.parse_transactions(all_text, keep_raw=keep_raw)
         
         # Extract account info from first page
         account_info = self.extract_account_info(all_text)
@@ -203,9 +491,13 @@ class BankStatementOCR:
             df = pd.DataFrame(all_transactions)
             result['dataframe'] = df
         elif output_format == 'csv' and all_transactions:
-            df = pd.DataFrame(all_transactions)
+            # Rows are flat dicts of strings, so write them straight out
+            # rather than building a DataFrame first
             csv_filename = file_path.rsplit('.', 1)[0] + '_transactions.csv'
-            df.to_csv(csv_filename, index=False)
+            with open(csv_filename, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=RAW_TRANSACTION_FIELDS if keep_raw else TRANSACTION_FIELDS)
+                writer.writeheader()
+                writer.writerows(all_transactions)
             logger.info("Transactions saved to %s", csv_filename)
             result['csv_file'] = csv_filename
 
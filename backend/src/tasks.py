@@ -0,0 +1,157 @@
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from celery import Celery, Task, shared_task
+from celery.signals import worker_process_init, worker_process_shutdown
+from dateutil import parser as date_parser
+from sqlalchemy import insert
+
+from src import categorizer
+from src.models import db, Bank, BankStatement, Transaction
+from src.ocr_processor import BankStatementOCR
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_ocr_processor = None
+
+def celery_init_app(app):
+    """Create the Celery app and run every task inside the Flask app context"""
+    class FlaskTask(Task):
+        def __call__(self, *args, **kwargs):
+            with app.app_context():
+                return self.run(*args, **kwargs)
+
+    celery_app = Celery(app.name, task_cls=FlaskTask)
+    celery_app.config_from_object(app.config['CELERY'])
+    celery_app.set_default()
+    app.extensions['celery'] = celery_app
+    return celery_app
+
+def get_ocr_processor():
+    """Load the OCR engine once per worker process"""
+    global _ocr_processor
+    if _ocr_processor is None:
+        _ocr_processor = BankStatementOCR(pdf_backend=os.environ.get('OCR_PDF_BACKEND', 'pdf2image'))
+    return _ocr_processor
+
+@worker_process_init.connect
+def warm_ocr_processor(**kwargs):
+    """Load the language model when a worker process starts, not on its first task"""
+    try:
+        get_ocr_processor().warm_up()
+    except (RuntimeError, threading.BrokenBarrierError) as e:
+        logger.warning("Could not preload Tesseract, engines will load on first use: %s", e)
+
+@worker_process_shutdown.connect
+def close_ocr_processor(**kwargs):
+    """Release the Tesseract engines when a worker process exits"""
+    global _ocr_processor
+    if _ocr_processor is not None:
+        _ocr_processor.close()
+        _ocr_processor = None
+
+def bank_pipeline(bank):
+    """Preprocessing steps from a bank's config_json 'preprocess' list, if set"""
+    steps = ((bank and bank.config_json) or {}).get('preprocess')
+    return tuple(steps) if steps else None
+
+def get_preprocess_pipeline(statement):
+    """Preprocessing steps configured for the statement's bank, if any"""
+    # bank_name is set at upload from the client's bank code
+    if not statement.bank_name:
+        return None
+    return bank_pipeline(Bank.query.filter_by(name=statement.bank_name, is_active=True).first())
+
+def parse_amount(value):
+    try:
+        return Decimal(str(value).replace(',', ''))
+    except (InvalidOperation, TypeError):
+        return None
+
+def parse_date(value):
+    try:
+        return date_parser.parse(value).date()
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+def mark_failed(statement, error):
+    """Roll back the failed work and record the error on the statement"""
+    db.session.rollback()
+    statement.processing_status = 'failed'
+    statement.processing_error = str(error)
+    statement.processed_at = datetime.utcnow()
+    db.session.commit()
+
+@shared_task(ignore_result=True)
+def run_ocr(statement_id, filepath):
+    """OCR an uploaded statement and persist the results on its BankStatement row"""
+    statement = db.session.get(BankStatement, uuid.UUID(statement_id))
+    if statement is None:
+        logger.warning("Statement %s no longer exists, skipping OCR", statement_id)
+        return
+
+    statement.processing_status = 'processing'
+    db.session.commit()
+
+    try:
+        ocr_result = get_ocr_processor().process_statement(
+            filepath, output_format='dict', pipeline=get_preprocess_pipeline(statement),
+            keep_raw=True  # stored as each Transaction's raw_text
+        )
+    except Exception as e:
+        logger.error("OCR failed for statement %s: %s", statement_id, e)
+        mark_failed(statement, e)
+        return
+
+    try:
+        save_ocr_result(statement, ocr_result)
+    except Exception as e:
+        # Without this the row would stay 'processing' and clients would
+        # poll it until they time out
+        logger.error("Saving OCR results failed for statement %s: %s", statement_id, e)
+        mark_failed(statement, e)
+        return
+    logger.info("Statement %s processed", statement_id)
+
+def save_ocr_result(statement, ocr_result):
+    """Store the parsed account info and transactions and complete the statement"""
+    account_info = ocr_result.get('account_info', {})
+    statement.account_info_json = account_info
+    statement.account_number = (account_info.get('account_number') or '')[:50] or None
+    statement.account_holder_name = (account_info.get('customer_name') or '')[:255] or None
+    statement.opening_balance = parse_amount(account_info.get('opening_balance'))
+    statement.closing_balance = parse_amount(account_info.get('closing_balance'))
+    statement.raw_text = ocr_result.get('raw_text', '')
+
+    rows = []
+    for parsed in ocr_result.get('transactions', []):
+        amount = parse_amount(parsed.get('amount'))
+        if amount is None:
+            logger.warning("Skipping transaction with unparseable amount: %r", parsed.get('amount'))
+            continue
+        category, subcategory = categorizer.classify(parsed.get('description'))
+        rows.append({
+            'statement_id': statement.id,
+            'transaction_date': parse_date(parsed.get('date')),
+            'description': parsed.get('description'),
+            'amount': amount,
+            'category': category,
+            'subcategory': subcategory,
+            'raw_text': parsed.get('raw_line'),
+        })
+
+    if rows:
+        # One batched multi-row INSERT instead of a unit-of-work flush per
+        # transaction; bulk inserts skip the after_insert counter hook, so
+        # bump transaction_count here in the same commit
+        db.session.execute(insert(Transaction), rows)
+        statement.transaction_count = (statement.transaction_count or 0) + len(rows)
+
+    statement.processing_status = 'completed'
+    statement.processed_at = datetime.utcnow()
+    db.session.commit()
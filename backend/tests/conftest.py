@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# app.py reads these at import time; set them before any test imports it
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost/test')
+os.environ.setdefault('JWT_SECRET_KEY', 'test-secret-key-for-signing-tokens')
+os.environ.setdefault('UPLOAD_FOLDER', tempfile.mkdtemp(prefix='uploads_'))
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from app import app
+from src.auth import MAX_PASSWORD_BYTES, create_hashed_password, verify_password
+
+def test_password_round_trip():
+    hashed = create_hashed_password('correct horse')
+    assert verify_password(hashed, 'correct horse')
+    assert not verify_password(hashed, 'wrong horse')
+
+def test_password_at_bcrypt_limit_is_accepted():
+    password = 'é' * (MAX_PASSWORD_BYTES // 2)
+    assert verify_password(create_hashed_password(password), password)
+
+def test_password_over_bcrypt_limit_is_refused():
+    with pytest.raises(ValueError):
+        create_hashed_password('x' * (MAX_PASSWORD_BYTES + 1))
+
+def test_register_rejects_password_over_bcrypt_limit():
+    client = app.test_client()
+    response = client.post('/register', json={
+        'username': 'long', 'email': 'long@example.com', 'password': 'x' * (MAX_PASSWORD_BYTES + 1)
+    })
+    assert response.status_code == 400
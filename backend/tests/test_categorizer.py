@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from src import categorizer
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def incr(self, key):
+        self.values[key] = int(self.values.get(key) or 0) + 1
+        return self.values[key]
+
+@pytest.fixture
+def shared_redis(monkeypatch):
+    fake = FakeRedis()
+    builds = []
+    monkeypatch.setattr(categorizer, 'get_redis', lambda: fake)
+    monkeypatch.setattr(categorizer, 'build_automaton', lambda: builds.append(object()) or builds[-1])
+    monkeypatch.setattr(categorizer, '_cached', None)
+    monkeypatch.setattr(categorizer, '_version_checked_at', float('-inf'))
+    return fake, builds
+
+def test_automaton_is_reused_until_categories_change(shared_redis):
+    fake, builds = shared_redis
+    first = categorizer.get_automaton()
+    assert categorizer.get_automaton() is first
+
+    categorizer.invalidate()
+    assert fake.values[categorizer.VERSION_KEY] == 1
+    assert categorizer.get_automaton() is not first
+    assert len(builds) == 2
+
+def test_change_in_another_process_triggers_rebuild(shared_redis, monkeypatch):
+    fake, builds = shared_redis
+    first = categorizer.get_automaton()
+
+    # Another process bumps the version; it is noticed on the next check
+    fake.incr(categorizer.VERSION_KEY)
+    assert categorizer.get_automaton() is first
+    monkeypatch.setattr(categorizer, '_version_checked_at', float('-inf'))
+    assert categorizer.get_automaton() is not first
@@ -0,0 +1,33 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from sqlalchemy.dialects import postgresql
+
+from app import app
+from src import categorizer, database
+from src.models import db
+
+def test_seeded_banks_keep_their_config(monkeypatch):
+    statements = []
+    def capture(statement, *args, **kwargs):
+        statements.append(statement)
+        class Result:
+            def all(self):
+                return []
+        return Result()
+    monkeypatch.setattr(db.session, 'execute', capture)
+    monkeypatch.setattr(db.session, 'commit', lambda: None)
+    monkeypatch.setattr(categorizer, 'invalidate', lambda: None)
+
+    with app.app_context():
+        database.seed_initial_data()
+
+    compiled = statements[0].compile(dialect=postgresql.dialect())
+    assert 'config_json' in str(compiled)
+    configs = {
+        compiled.params[f'code_m{row}']: compiled.params[f'config_json_m{row}']
+        for row in range(3)
+    }
+    assert configs['WF']['preprocess'] == ['deskew', 'upscale', 'equalize', 'otsu']
+    assert configs['BOA'] == {'requires_ocr': True, 'supported_formats': ['pdf', 'jpg', 'png']}
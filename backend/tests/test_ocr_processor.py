@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from src.ocr_processor import BankStatementOCR
+
+@pytest.fixture(scope='module')
+def ocr():
+    # No engine is loaded until a page is OCR'd, so parsing needs no tessdata
+    processor = BankStatementOCR(max_workers=1)
+    yield processor
+    processor.close()
+
+@pytest.mark.parametrize('line, amount, description', [
+    ('01/03/2024 Coffee Shop 4.50', '4.50', 'Coffee Shop'),
+    ('01/04/2024 Grocery $45.10', '45.10', 'Grocery'),
+    ('01/05/2024 Refund -12.00', '-12.00', 'Refund'),
+    ('01/06/2024 Card payment 100.00-', '-100.00', 'Card payment'),
+    ('01/07/2024 Rent $1,250.00 DR', '-1250.00', 'Rent'),
+    ('01/08/2024 Salary 3,000.00 CR', '3000.00', 'Salary'),
+    ('01/09/2024 Transfer +$20.00', '20.00', 'Transfer'),
+])
+def test_parse_transactions_amount_formats(ocr, line, amount, description):
+    transactions = ocr.parse_transactions(line)
+    assert transactions == [{'date': line[:10], 'amount': amount, 'description': description}]
+
+def test_parse_transactions_takes_first_amount_on_line(ocr):
+    text = "Statement header\n01/04/2024 Grocery $45.10 $1,200.00\nfooter 12.00"
+    transactions = ocr.parse_transactions(text, keep_raw=True)
+    assert len(transactions) == 1
+    assert transactions[0]['amount'] == '45.10'
+    assert transactions[0]['raw_line'] == '01/04/2024 Grocery $45.10 $1,200.00'
+
+def test_parse_transactions_ignores_lines_without_amount(ocr):
+    assert ocr.parse_transactions("01/04/2024 Pending hold\n01/04/2024 Fee 12") == []
+
+def test_extract_account_info(ocr):
+    text = (
+        "Name: Jane Doe\n"
+        "Account No: 12345678\n"
+        "Statement Period: 01/01/2024 to 01/31/2024\n"
+        "Opening Balance: $1,234.56\n"
+        "Closing Balance: -$20.00\n"
+    )
+    info = ocr.extract_account_info(text)
+    assert info['account_number'] == '12345678'
+    assert info['statement_period'] == '01/01/2024 to 01/31/2024'
+    assert info['opening_balance'] == '1,234.56'
+    assert info['closing_balance'] == '-20.00'
+    assert info['customer_name'] == 'Jane Doe'
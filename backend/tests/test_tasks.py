@@ -0,0 +1,53 @@
+import os
+import sys
+import uuid
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from sqlalchemy.exc import DataError
+
+from app import app
+from src import tasks
+from src.models import db, Bank, BankStatement
+from src.ocr_processor import build_pipeline
+from src.tasks import bank_pipeline
+
+def test_bank_pipeline_reads_preprocess_steps():
+    bank = Bank(name='Wells Fargo', code='WF',
+                config_json={'requires_ocr': True, 'preprocess': ['deskew', 'upscale', 'equalize', 'otsu']})
+    steps = bank_pipeline(bank)
+    assert steps == ('deskew', 'upscale', 'equalize', 'otsu')
+    # Every configured step must exist, or the worker would fail on the first page
+    assert callable(build_pipeline(steps))
+
+def test_bank_pipeline_defaults_when_unset():
+    assert bank_pipeline(None) is None
+    assert bank_pipeline(Bank(name='Chase Bank', code='CHASE', config_json=None)) is None
+    assert bank_pipeline(Bank(name='Chase Bank', code='CHASE', config_json={'requires_ocr': True})) is None
+
+class StubProcessor:
+    def process_statement(self, *args, **kwargs):
+        return {
+            'account_info': {'customer_name': 'Jane Doe'},
+            'transactions': [{'date': '01/04/2024', 'amount': '45.10', 'description': 'Grocery'}],
+            'raw_text': '01/04/2024 Grocery 45.10',
+        }
+
+def test_run_ocr_marks_statement_failed_when_saving_fails(monkeypatch):
+    statement = BankStatement(id=uuid.uuid4(), original_filename='s.pdf', processing_status='pending')
+    rollbacks = []
+    def failing_execute(*args, **kwargs):
+        raise DataError('INSERT', {}, Exception('value too long'))
+    monkeypatch.setattr(tasks, 'get_ocr_processor', StubProcessor)
+    monkeypatch.setattr(tasks, 'get_preprocess_pipeline', lambda statement: None)
+    monkeypatch.setattr(tasks.categorizer, 'classify', lambda description: (None, None))
+    monkeypatch.setattr(db.session, 'get', lambda model, key: statement)
+    monkeypatch.setattr(db.session, 'execute', failing_execute)
+    monkeypatch.setattr(db.session, 'commit', lambda: None)
+    monkeypatch.setattr(db.session, 'rollback', lambda: rollbacks.append(True))
+
+    with app.app_context():
+        tasks.run_ocr.run(str(statement.id), 's.pdf')
+
+    assert rollbacks
+    assert statement.processing_status == 'failed'
+    assert 'value too long' in statement.processing_error
@@ -0,0 +1,44 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from flask_jwt_extended import create_access_token
+from app import app, db
+
+USER_ID = '6f1c2a8e-1d4b-4c1e-9a53-0c7f1e2b3d4a'
+
+def auth_headers():
+    with app.app_context():
+        return {'Authorization': f'Bearer {create_access_token(identity=USER_ID)}'}
+
+def test_raw_body_upload_is_queued(monkeypatch):
+    added = []
+    queued = []
+    monkeypatch.setattr(db.session, 'add', added.append)
+    monkeypatch.setattr(db.session, 'commit', lambda: None)
+    monkeypatch.setattr('app.run_ocr.delay', lambda *args: queued.append(args))
+
+    client = app.test_client()
+    response = client.post(
+        '/ocr/process',
+        data=b'%PDF-1.4 dummy',
+        headers={**auth_headers(), 'Content-Type': 'application/pdf', 'X-Filename': 'May%202024.pdf'}
+    )
+    assert response.status_code == 202
+    statement = added[0]
+    assert statement.original_filename == 'May 2024.pdf'
+    assert statement.file_type == 'application/pdf'
+    with open(statement.file_path, 'rb') as f:
+        assert f.read() == b'%PDF-1.4 dummy'
+    assert queued[0][1] == statement.file_path
+
+def test_raw_body_over_limit_is_rejected(monkeypatch):
+    monkeypatch.setitem(app.config, 'MAX_CONTENT_LENGTH', 1024)
+
+    client = app.test_client()
+    response = client.post(
+        '/ocr/process',
+        data=b'x' * 2048,
+        headers={**auth_headers(), 'Content-Type': 'application/pdf', 'X-Filename': 'big.pdf'}
+    )
+    assert response.status_code == 413
@@ -8,8 +8,12 @@ import sys
 import logging
 from pathlib import Path
 import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from psycopg2 import errors, sql
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT, connection as pg_connection
+from psycopg2.pool import ThreadedConnectionPool
 import argparse
+import importlib.util
+from contextlib import contextmanager
 from datetime import datetime
 
 # Add parent directory to path
@@ -20,6 +24,29 @@ from database import DatabaseConfig
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Server-side prepared statements for the schema_migrations bookkeeping,
+# parsed and planned once per pooled connection
+PREPARED_STATEMENTS = (
+    """
+    PREPARE record_migration (VARCHAR, INTEGER, BOOLEAN, TEXT) AS
+        INSERT INTO schema_migrations (version, execution_time_ms, success, error_message)
+        VALUES ($1, $2, $3, $4)
+    """,
+    """
+    PREPARE executed_migrations AS
+        SELECT version FROM schema_migrations
+        WHERE success = TRUE
+        ORDER BY version
+    """,
+)
+
+class MigrationConnection(pg_connection):
+    """psycopg2 connection that remembers whether its statements are prepared"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements_prepared = False
+
 class MigrationRunner:
     """Handles database migrations"""
     
@@ -27,6 +54,54 @@ class MigrationRunner:
         self.db_uri = DatabaseConfig.get_database_uri()
         self.migrations_dir = Path(__file__).parent / 'migrations'
         self.schema_file = Path(__file__).parent / 'schema.sql'
+        self._schema_sql = self.schema_file.read_text() if self.schema_file.exists() else None
+        self._pool = None
+        
+    def _get_pool(self):
+        """Get the connection pool for the target database, created on first use"""
+        # Created lazily: the target database may not exist until create_database() runs
+        if self._pool is None:
+            self._pool = ThreadedConnectionPool(
+                1, 4, dsn=self.db_uri, connection_factory=MigrationConnection
+            )
+        return self._pool
+    
+    def _prepare_statements(self, conn):
+        """PREPARE the schema_migrations statements once per connection"""
+        if conn.statements_prepared:
+            return
+        with conn.cursor() as cur:
+            for statement in PREPARED_STATEMENTS:
+                cur.execute(statement)
+        # Commit straight away so a later rollback can't take them with it
+        conn.commit()
+        conn.statements_prepared = True
+    
+    @contextmanager
+    def _connection(self):
+        """Borrow a pooled connection to the target database"""
+        pool = self._get_pool()
+        conn = pool.getconn()
+        try:
+            yield conn
+        finally:
+            if not conn.closed:
+                conn.rollback()
+            pool.putconn(conn)
+    
+    @contextmanager
+    def _cursor(self):
+        """Borrow a pooled cursor, committing when the block succeeds"""
+        with self._connection() as conn:
+            with conn.cursor() as cur:
+                yield cur
+            conn.commit()
+    
+    def close(self):
+        """Close all pooled connections"""
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
         
     def get_connection(self, database=None):
         """Get database connection"""
@@ -48,16 +123,10 @@ class MigrationRunner:
             conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
             cur = conn.cursor()
             
-            # Check if database exists
-            cur.execute(
-                "SELECT 1 FROM pg_database WHERE datname = %s",
-                (db_name,)
-            )
-            
-            if not cur.fetchone():
-                cur.execute(f"CREATE DATABASE {db_name}")
+            try:
+                cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(db_name)))
                 logger.info(f"Created database: {db_name}")
-            else:
+            except errors.DuplicateDatabase:
                 logger.info(f"Database already exists: {db_name}")
                 
             cur.close()
@@ -69,122 +138,101 @@ class MigrationRunner:
     
     def create_migration_table(self):
         """Create migration tracking table"""
-        conn = self.get_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS schema_migrations (
-                version VARCHAR(255) PRIMARY KEY,
-                executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                execution_time_ms INTEGER,
-                success BOOLEAN DEFAULT TRUE,
-                error_message TEXT
-            )
-        """)
-        
-        conn.commit()
-        cur.close()
-        conn.close()
+        with self._cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version VARCHAR(255) PRIMARY KEY,
+                    executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    execution_time_ms INTEGER,
+                    success BOOLEAN DEFAULT TRUE,
+                    error_message TEXT
+                )
+            """)
         
         logger.info("Migration tracking table ready")
     
     def get_executed_migrations(self):
         """Get list of already executed migrations"""
-        conn = self.get_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT version FROM schema_migrations 
-            WHERE success = TRUE 
-            ORDER BY version
-        """)
-        
-        executed = [row[0] for row in cur.fetchall()]
-        
-        cur.close()
-        conn.close()
-        
-        return executed
+        with self._connection() as conn:
+            self._prepare_statements(conn)
+            with conn.cursor() as cur:
+                cur.execute("EXECUTE executed_migrations")
+                return [row[0] for row in cur.fetchall()]
     
     def execute_schema_file(self):
         """Execute the complete schema.sql file"""
-        if not self.schema_file.exists():
+        if self._schema_sql is None:
             logger.error(f"Schema file not found: {self.schema_file}")
             return False
             
-        conn = self.get_connection()
-        cur = conn.cursor()
-        
         try:
-            # Read and execute schema file
-            with open(self.schema_file, 'r') as f:
-                schema_sql = f.read()
-                
-            # Execute the schema
-            cur.execute(schema_sql)
-            conn.commit()
+            # Execute the schema read at startup
+            with self._cursor() as cur:
+                cur.execute(self._schema_sql)
             
             logger.info("Schema successfully applied")
             return True
             
         except Exception as e:
-            conn.rollback()
             logger.error(f"Error applying schema: {e}")
             return False
-            
-        finally:
-            cur.close()
-            conn.close()
     
-    def run_migration(self, migration_file):
-        """Run a single migration file"""
-        import importlib.util
-        
-        # Load migration module
+    def load_migration(self, migration_file):
+        """Import a migration file as a module"""
         spec = importlib.util.spec_from_file_location(
             migration_file.stem,
             migration_file
         )
         migration = importlib.util.module_from_spec(spec)
         spec.loader.exec_module(migration)
+        return migration
+    
+    def run_migration(self, migration_file, migration=None):
+        """
+        Run a single migration file
         
-        conn = self.get_connection()
-        cur = conn.cursor()
+        The migration's upgrade(conn) and its schema_migrations record share
+        one transaction, so a failed migration leaves no partial changes.
+        """
+        if migration is None:
+            migration = self.load_migration(migration_file)
         
         start_time = datetime.now()
         
-        try:
-            # Run upgrade function
-            migration.upgrade()
-            
-            # Record successful migration
-            execution_time = int((datetime.now() - start_time).total_seconds() * 1000)
-            
-            cur.execute("""
-                INSERT INTO schema_migrations (version, execution_time_ms, success)
-                VALUES (%s, %s, %s)
-            """, (migration_file.stem, execution_time, True))
-            
-            conn.commit()
-            logger.info(f"Successfully ran migration: {migration_file.stem}")
-            return True
-            
-        except Exception as e:
-            conn.rollback()
-            
-            # Record failed migration
-            cur.execute("""
-                INSERT INTO schema_migrations (version, success, error_message)
-                VALUES (%s, %s, %s)
-            """, (migration_file.stem, False, str(e)))
-            
-            conn.commit()
-            logger.error(f"Failed to run migration {migration_file.stem}: {e}")
-            return False
-            
-        finally:
-            cur.close()
-            conn.close()
+        with self._connection() as conn:
+            self._prepare_statements(conn)
+            cur = conn.cursor()
+            try:
+                # Run upgrade function on this transaction
+                migration.upgrade(conn)
+                
+                # Record successful migration
+                execution_time = int((datetime.now() - start_time).total_seconds() * 1000)
+                
+                cur.execute(
+                    "EXECUTE record_migration (%s, %s, %s, %s)",
+                    (migration_file.stem, execution_time, True, None)
+                )
+                
+                conn.commit()
+                logger.info(f"Successfully ran migration: {migration_file.stem}")
+                return True
+                
+            except Exception as e:
+                conn.rollback()
+                
+                # Record failed migration
+                cur.execute(
+                    "EXECUTE record_migration (%s, %s, %s, %s)",
+                    (migration_file.stem, None, False, str(e))
+                )
+                
+                conn.commit()
+                logger.error(f"Failed to run migration {migration_file.stem}: {e}")
+                return False
+                
+            finally:
+                cur.close()
 
     def run_all_migrations(self):
         """Run all pending migrations"""
@@ -193,21 +241,34 @@ class MigrationRunner:
             return
         
         # Get executed migrations
-        executed = self.get_executed_migrations()
+        executed = set(self.get_executed_migrations())
+        
+        # Get all pending migration files; scandir entries already carry
+        # their file type, so no per-file stat is needed
+        with os.scandir(self.migrations_dir) as entries:
+            names = sorted(
+                entry.name for entry in entries
+                if entry.name.endswith('.py') and entry.is_file(follow_symlinks=False)
+            )
+        pending = [
+            self.migrations_dir / name
+            for name in names
+            if name[:-3] not in executed
+        ]
         
-        # Get all migration files
-        migration_files = sorted(self.migrations_dir.glob('*.py'))
+        # Import every pending migration up front so a broken file fails
+        # before any of them touch the database
+        migrations = [(migration_file, self.load_migration(migration_file)) for migration_file in pending]
         
         # Run pending migrations
         pending_count = 0
-        for migration_file in migration_files:
-            if migration_file.stem not in executed:
-                logger.info(f"Running migration: {migration_file.stem}")
-                if self.run_migration(migration_file):
-                    pending_count += 1
-                else:
-                    logger.error(f"Migration failed, stopping execution")
-                    break
+        for migration_file, migration in migrations:
+            logger.info(f"Running migration: {migration_file.stem}")
+            if self.run_migration(migration_file, migration):
+                pending_count += 1
+            else:
+                logger.error(f"Migration failed, stopping execution")
+                break
         
         if pending_count == 0:
             logger.info("No pending migrations to run")
@@ -216,61 +277,50 @@ class MigrationRunner:
     
     def rollback_migration(self, version):
         """Rollback a specific migration"""
-        import importlib.util
-        
         migration_file = self.migrations_dir / f"{version}.py"
         if not migration_file.exists():
             logger.error(f"Migration file not found: {migration_file}")
             return False
         
-        # Load migration module
-        spec = importlib.util.spec_from_file_location(version, migration_file)
-        migration = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(migration)
-        
-        conn = self.get_connection()
-        cur = conn.cursor()
-        
-        try:
-            # Run downgrade function
-            migration.downgrade()
-            
-            # Remove from migration table
-            cur.execute("""
-                DELETE FROM schema_migrations WHERE version = %s
-            """, (version,))
-            
-            conn.commit()
-            logger.info(f"Successfully rolled back migration: {version}")
-            return True
-            
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Failed to rollback migration {version}: {e}")
-            return False
-            
-        finally:
-            cur.close()
-            conn.close()
+        migration = self.load_migration(migration_file)
+        
+        with self._connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    # Run downgrade function on this transaction
+                    migration.downgrade(conn)
+                    
+                    # Remove from migration table
+                    cur.execute("""
+                        DELETE FROM schema_migrations WHERE version = %s
+                    """, (version,))
+                
+                conn.commit()
+                logger.info(f"Successfully rolled back migration: {version}")
+                return True
+                
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Failed to rollback migration {version}: {e}")
+                return False
     
     def get_migration_status(self):
         """Get status of all migrations"""
-        conn = self.get_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT 
-                version,
-                executed_at,
-                execution_time_ms,
-                success,
-                error_message
-            FROM schema_migrations
-            ORDER BY executed_at DESC
-        """)
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT 
+                    version,
+                    executed_at,
+                    execution_time_ms,
+                    success,
+                    error_message
+                FROM schema_migrations
+                ORDER BY executed_at DESC
+            """)
+            rows = cur.fetchall()
         
         migrations = []
-        for row in cur.fetchall():
+        for row in rows:
             migrations.append({
                 'version': row[0],
                 'executed_at': row[1].isoformat() if row[1] else None,
@@ -279,35 +329,23 @@ class MigrationRunner:
                 'error_message': row[4]
             })
         
-        cur.close()
-        conn.close()
-        
         return migrations
     
     def reset_database(self):
-        """Reset database - drop all tables and reapply schema"""
+        """Reset database - drop the public schema and reapply schema"""
         if input("This will DELETE ALL DATA. Are you sure? (yes/no): ").lower() != 'yes':
             logger.info("Reset cancelled")
             return
         
-        conn = self.get_connection()
-        cur = conn.cursor()
-        
         try:
-            # Get all tables
-            cur.execute("""
-                SELECT tablename FROM pg_tables
-                WHERE schemaname = 'public'
-            """)
-            
-            tables = [row[0] for row in cur.fetchall()]
-            
-            # Drop all tables
-            for table in tables:
-                cur.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
-                logger.info(f"Dropped table: {table}")
-            
-            conn.commit()
+            with self._cursor() as cur:
+                # Drop everything in the public schema in one statement
+                cur.execute("""
+                    DROP SCHEMA public CASCADE;
+                    CREATE SCHEMA public;
+                    GRANT ALL ON SCHEMA public TO public;
+                """)
+                logger.info("Dropped and recreated schema: public")
             
             # Reapply schema
             if self.execute_schema_file():
@@ -316,12 +354,7 @@ class MigrationRunner:
                 logger.error("Failed to reapply schema")
                 
         except Exception as e:
-            conn.rollback()
             logger.error(f"Error resetting database: {e}")
-            
-        finally:
-            cur.close()
-            conn.close()
 
 def main():
     """Main CLI entry point"""
@@ -339,7 +372,13 @@ def main():
     args = parser.parse_args()
     
     runner = MigrationRunner()
-    
+    try:
+        run_command(runner, args)
+    finally:
+        runner.close()
+
+def run_command(runner, args):
+    """Dispatch a CLI command to the migration runner"""
     if args.command == 'create':
         # Create database and migration table
         runner.create_database()
@@ -0,0 +1,38 @@
+"""
+Add the denormalized statement/transaction counters
+
+users.statement_count and bank_statements.transaction_count are kept up to
+date by the model insert/delete events; this adds them to databases created
+before they existed and backfills them from the current rows. Recounting is
+idempotent, so the migration is also safe on a database built from schema.sql.
+"""
+
+def upgrade(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            ALTER TABLE users
+                ADD COLUMN IF NOT EXISTS statement_count INTEGER NOT NULL DEFAULT 0;
+            ALTER TABLE bank_statements
+                ADD COLUMN IF NOT EXISTS transaction_count INTEGER NOT NULL DEFAULT 0;
+
+            UPDATE users u
+            SET statement_count = counts.n
+            FROM (
+                SELECT user_id, COUNT(*) AS n FROM bank_statements GROUP BY user_id
+            ) counts
+            WHERE counts.user_id = u.id;
+
+            UPDATE bank_statements bs
+            SET transaction_count = counts.n
+            FROM (
+                SELECT statement_id, COUNT(*) AS n FROM transactions GROUP BY statement_id
+            ) counts
+            WHERE counts.statement_id = bs.id;
+        """)
+
+def downgrade(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            ALTER TABLE bank_statements DROP COLUMN IF EXISTS transaction_count CASCADE;
+            ALTER TABLE users DROP COLUMN IF EXISTS statement_count;
+        """)
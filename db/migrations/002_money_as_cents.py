@@ -0,0 +1,218 @@
+"""
+Store money columns as integer cents
+
+Converts the DECIMAL(12, 2) amount and balance columns to BIGINT cents, the
+representation the Cents model type reads and writes. Columns that are
+already BIGINT (databases built from the current schema.sql) are left alone,
+so stored cents are never scaled twice.
+
+The views selecting these columns are dropped first, since PostgreSQL won't
+change the type of a column a view depends on, and recreated with the
+cents-to-units conversion.
+"""
+
+MONEY_COLUMNS = {
+    'bank_statements': ('opening_balance', 'closing_balance', 'total_credits', 'total_debits'),
+    'transactions': ('amount', 'balance'),
+}
+
+DROP_VIEWS = """
+    DROP VIEW IF EXISTS statement_summary;
+    DROP VIEW IF EXISTS transaction_analysis;
+    DROP VIEW IF EXISTS monthly_spending_summary;
+"""
+
+CENTS_VIEWS = """
+    CREATE VIEW statement_summary AS
+    SELECT
+        bs.id,
+        bs.user_id,
+        u.username,
+        bs.bank_name,
+        bs.account_number,
+        bs.statement_period_start,
+        bs.statement_period_end,
+        bs.opening_balance / 100.0 AS opening_balance,
+        bs.closing_balance / 100.0 AS closing_balance,
+        bs.total_credits / 100.0 AS total_credits,
+        bs.total_debits / 100.0 AS total_debits,
+        bs.processing_status,
+        bs.transaction_count,
+        bs.uploaded_at,
+        bs.processed_at
+    FROM bank_statements bs
+    JOIN users u ON bs.user_id = u.id;
+
+    CREATE VIEW transaction_analysis AS
+    SELECT
+        t.id,
+        t.statement_id,
+        bs.user_id,
+        t.transaction_date,
+        t.description,
+        t.amount / 100.0 AS amount,
+        t.transaction_type,
+        t.category,
+        t.subcategory,
+        t.merchant_name,
+        tc.color as category_color,
+        tc.icon as category_icon
+    FROM transactions t
+    JOIN bank_statements bs ON t.statement_id = bs.id
+    LEFT JOIN transaction_categories tc ON t.category = tc.name;
+
+    CREATE VIEW monthly_spending_summary AS
+    SELECT
+        bs.user_id,
+        DATE_TRUNC('month', t.transaction_date) as month,
+        t.category,
+        t.transaction_type,
+        COUNT(*) as transaction_count,
+        SUM(CASE WHEN t.transaction_type = 'debit' THEN t.amount ELSE 0 END) / 100.0 as total_debits,
+        SUM(CASE WHEN t.transaction_type = 'credit' THEN t.amount ELSE 0 END) / 100.0 as total_credits,
+        AVG(t.amount) / 100.0 as avg_transaction_amount
+    FROM transactions t
+    JOIN bank_statements bs ON t.statement_id = bs.id
+    WHERE t.transaction_date IS NOT NULL
+    GROUP BY bs.user_id, DATE_TRUNC('month', t.transaction_date), t.category, t.transaction_type;
+"""
+
+DECIMAL_VIEWS = """
+    CREATE VIEW statement_summary AS
+    SELECT
+        bs.id,
+        bs.user_id,
+        u.username,
+        bs.bank_name,
+        bs.account_number,
+        bs.statement_period_start,
+        bs.statement_period_end,
+        bs.opening_balance,
+        bs.closing_balance,
+        bs.total_credits,
+        bs.total_debits,
+        bs.processing_status,
+        bs.transaction_count,
+        bs.uploaded_at,
+        bs.processed_at
+    FROM bank_statements bs
+    JOIN users u ON bs.user_id = u.id;
+
+    CREATE VIEW transaction_analysis AS
+    SELECT
+        t.id,
+        t.statement_id,
+        bs.user_id,
+        t.transaction_date,
+        t.description,
+        t.amount,
+        t.transaction_type,
+        t.category,
+        t.subcategory,
+        t.merchant_name,
+        tc.color as category_color,
+        tc.icon as category_icon
+    FROM transactions t
+    JOIN bank_statements bs ON t.statement_id = bs.id
+    LEFT JOIN transaction_categories tc ON t.category = tc.name;
+
+    CREATE VIEW monthly_spending_summary AS
+    SELECT
+        bs.user_id,
+        DATE_TRUNC('month', t.transaction_date) as month,
+        t.category,
+        t.transaction_type,
+        COUNT(*) as transaction_count,
+        SUM(CASE WHEN t.transaction_type = 'debit' THEN t.amount ELSE 0 END) as total_debits,
+        SUM(CASE WHEN t.transaction_type = 'credit' THEN t.amount ELSE 0 END) as total_credits,
+        AVG(t.amount) as avg_transaction_amount
+    FROM transactions t
+    JOIN bank_statements bs ON t.statement_id = bs.id
+    WHERE t.transaction_date IS NOT NULL
+    GROUP BY bs.user_id, DATE_TRUNC('month', t.transaction_date), t.category, t.transaction_type;
+"""
+
+def _balance_consistency_function(scale):
+    # plpgsql bodies aren't tracked as dependencies, so the function has to be
+    # replaced by hand to read the columns in their new unit
+    return f"""
+    CREATE OR REPLACE FUNCTION check_balance_consistency(statement_id UUID)
+    RETURNS TABLE(
+        is_consistent BOOLEAN,
+        calculated_closing DECIMAL(12, 2),
+        stated_closing DECIMAL(12, 2),
+        difference DECIMAL(12, 2)
+    ) AS $$DECLARE
+        opening DECIMAL(12, 2);
+        closing DECIMAL(12, 2);
+        total_credits DECIMAL(12, 2);
+        total_debits DECIMAL(12, 2);
+        calculated DECIMAL(12, 2);
+    BEGIN
+        SELECT opening_balance{scale}, closing_balance{scale}
+        INTO opening, closing
+        FROM bank_statements
+        WHERE id = statement_id;
+
+        SELECT
+            COALESCE(SUM(CASE WHEN transaction_type = 'credit' THEN amount ELSE 0 END), 0){scale},
+            COALESCE(SUM(CASE WHEN transaction_type = 'debit' THEN amount ELSE 0 END), 0){scale}
+        INTO total_credits, total_debits
+        FROM transactions
+        WHERE transactions.statement_id = check_balance_consistency.statement_id;
+
+        calculated := COALESCE(opening, 0) + total_credits - total_debits;
+
+        RETURN QUERY
+        SELECT
+            ABS(calculated - COALESCE(closing, 0)) < 0.01,
+            calculated,
+            closing,
+            calculated - COALESCE(closing, 0);
+    END;$$ LANGUAGE plpgsql;
+    """
+
+def _columns_of_type(cur, data_type):
+    """(table, column) pairs among MONEY_COLUMNS currently of the given type"""
+    cur.execute("""
+        SELECT table_name, column_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+        AND data_type = %s
+        AND table_name = ANY(%s)
+    """, (data_type, list(MONEY_COLUMNS)))
+    found = set(cur.fetchall())
+    return [
+        (table, column)
+        for table, columns in MONEY_COLUMNS.items()
+        for column in columns
+        if (table, column) in found
+    ]
+
+def upgrade(conn):
+    with conn.cursor() as cur:
+        columns = _columns_of_type(cur, 'numeric')
+        if not columns:
+            return
+        cur.execute(DROP_VIEWS)
+        for table, column in columns:
+            cur.execute(
+                f"ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT "
+                f"USING round({column} * 100)::BIGINT"
+            )
+        cur.execute(CENTS_VIEWS)
+        cur.execute(_balance_consistency_function(' / 100.0'))
+
+def downgrade(conn):
+    with conn.cursor() as cur:
+        columns = _columns_of_type(cur, 'bigint')
+        if not columns:
+            return
+        cur.execute(DROP_VIEWS)
+        for table, column in columns:
+            cur.execute(
+                f"ALTER TABLE {table} ALTER COLUMN {column} TYPE DECIMAL(12, 2) "
+                f"USING {column} / 100.0"
+            )
+        cur.execute(DECIMAL_VIEWS)
+        cur.execute(_balance_consistency_function(''))
@@ -0,0 +1,24 @@
+"""
+Seed the Wells Fargo OCR preprocessing profile
+
+Banks seeded before per-bank preprocessing existed don't carry a
+'preprocess' entry in config_json; merge the one schema.sql now seeds.
+"""
+
+def upgrade(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE banks
+            SET config_json = COALESCE(config_json, '{}'::jsonb)
+                || '{"preprocess": ["deskew", "upscale", "equalize", "otsu"]}'::jsonb
+            WHERE code = 'WF'
+            AND NOT COALESCE(config_json, '{}'::jsonb) ? 'preprocess'
+        """)
+
+def downgrade(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE banks
+            SET config_json = config_json - 'preprocess'
+            WHERE code = 'WF'
+        """)
@@ -0,0 +1,34 @@
+"""
+Replace the statement/transaction indexes with covering ones
+
+Brings databases created before the index rework in line with schema.sql:
+statements are listed per user newest first, and per-statement transaction
+listings and credit/debit totals are answered from the index alone.
+"""
+
+def upgrade(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            DROP INDEX IF EXISTS idx_user_statements;
+            CREATE INDEX IF NOT EXISTS idx_statements_user_uploaded
+                ON bank_statements(user_id, uploaded_at DESC);
+
+            DROP INDEX IF EXISTS idx_amount;
+            DROP INDEX IF EXISTS idx_statement_date;
+            CREATE INDEX idx_statement_date
+                ON transactions(statement_id, transaction_date) INCLUDE (amount, description);
+            CREATE INDEX IF NOT EXISTS idx_tx_statement_type
+                ON transactions(statement_id, transaction_type) INCLUDE (amount);
+        """)
+
+def downgrade(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            DROP INDEX IF EXISTS idx_tx_statement_type;
+            DROP INDEX IF EXISTS idx_statement_date;
+            CREATE INDEX idx_statement_date ON transactions(statement_id, transaction_date);
+            CREATE INDEX IF NOT EXISTS idx_amount ON transactions(amount);
+
+            DROP INDEX IF EXISTS idx_statements_user_uploaded;
+            CREATE INDEX IF NOT EXISTS idx_user_statements ON bank_statements(user_id);
+        """)
@@ -21,6 +21,7 @@ CREATE TABLE users (
     username VARCHAR(80) UNIQUE NOT NULL,
     email VARCHAR(120) UNIQUE NOT NULL,
     password_hash VARCHAR(255) NOT NULL,
+    statement_count INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
@@ -87,17 +88,18 @@ CREATE TABLE bank_statements (
     statement_period_start DATE,
     statement_period_end DATE,
     
-    -- Balance information
-    opening_balance DECIMAL(12, 2),
-    closing_balance DECIMAL(12, 2),
-    total_credits DECIMAL(12, 2),
-    total_debits DECIMAL(12, 2),
+    -- Balance information (integer cents)
+    opening_balance BIGINT,
+    closing_balance BIGINT,
+    total_credits BIGINT,
+    total_debits BIGINT,
     
     -- Metadata
     raw_text TEXT,
     account_info_json JSONB,
     processing_status VARCHAR(50) DEFAULT 'pending',
     processing_error TEXT,
+    transaction_count INTEGER NOT NULL DEFAULT 0,
     
     -- Timestamps
     uploaded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -112,7 +114,7 @@ CREATE TABLE bank_statements (
 );
 
 -- Create indexes for bank_statements
-CREATE INDEX idx_user_statements ON bank_statements(user_id);
+CREATE INDEX idx_statements_user_uploaded ON bank_statements(user_id, uploaded_at DESC);
 CREATE INDEX idx_processing_status ON bank_statements(processing_status);
 CREATE INDEX idx_statement_period ON bank_statements(statement_period_start, statement_period_end);
 CREATE INDEX idx_account_number ON bank_statements(account_number);
@@ -131,10 +133,10 @@ CREATE TABLE transactions (
     description TEXT,
     reference_number VARCHAR(100),
     
-    -- Amount information
-    amount DECIMAL(12, 2) NOT NULL,
+    -- Amount information (integer cents)
+    amount BIGINT NOT NULL,
     transaction_type VARCHAR(20),
-    balance DECIMAL(12, 2),
+    balance BIGINT,
     
     -- Categorization
     category VARCHAR(100),
@@ -166,9 +168,9 @@ CREATE TABLE transactions (
 
 -- Create indexes for transactions
 CREATE INDEX idx_transaction_date ON transactions(transaction_date);
-CREATE INDEX idx_amount ON transactions(amount);
 CREATE INDEX idx_category ON transactions(category);
-CREATE INDEX idx_statement_date ON transactions(statement_id, transaction_date);
+CREATE INDEX idx_statement_date ON transactions(statement_id, transaction_date) INCLUDE (amount, description);
+CREATE INDEX idx_tx_statement_type ON transactions(statement_id, transaction_type) INCLUDE (amount);
 CREATE INDEX idx_transaction_type ON transactions(transaction_type);
 CREATE INDEX idx_merchant_name ON transactions(merchant_name);
 CREATE INDEX idx_flagged_transactions ON transactions(is_flagged) WHERE is_flagged = TRUE;
@@ -245,18 +247,16 @@ SELECT
     bs.account_number,
     bs.statement_period_start,
     bs.statement_period_end,
-    bs.opening_balance,
-    bs.closing_balance,
-    bs.total_credits,
-    bs.total_debits,
+    bs.opening_balance / 100.0 AS opening_balance,
+    bs.closing_balance / 100.0 AS closing_balance,
+    bs.total_credits / 100.0 AS total_credits,
+    bs.total_debits / 100.0 AS total_debits,
     bs.processing_status,
-    COUNT(t.id) as transaction_count,
+    bs.transaction_count,
     bs.uploaded_at,
     bs.processed_at
 FROM bank_statements bs
-JOIN users u ON bs.user_id = u.id
-LEFT JOIN transactions t ON bs.id = t.statement_id
-GROUP BY bs.id, u.username;
+JOIN users u ON bs.user_id = u.id;
 
 -- View for transaction analysis
 CREATE VIEW transaction_analysis AS
@@ -266,14 +266,15 @@ SELECT
     bs.user_id,
     t.transaction_date,
     t.description,
-    t.amount,
+    t.amount / 100.0 AS amount,
     t.transaction_type,
     t.category,
     t.subcategory,
     t.merchant_name,
     tc.color as category_color,
-    tc.icon as category
-
+    tc.icon as category_icon
+FROM transactions t
+JOIN bank_statements bs ON t.statement_id = bs.id
 LEFT JOIN transaction_categories tc ON t.category = tc.name;
 
 -- View for monthly spending summary
@@ -284,9 +285,9 @@ SELECT
     t.category,
     t.transaction_type,
     COUNT(*) as transaction_count,
-    SUM(CASE WHEN t.transaction_type = 'debit' THEN t.amount ELSE 0 END) as total_debits,
-    SUM(CASE WHEN t.transaction_type = 'credit' THEN t.amount ELSE 0 END) as total_credits,
-    AVG(t.amount) as avg_transaction_amount
+    SUM(CASE WHEN t.transaction_type = 'debit' THEN t.amount ELSE 0 END) / 100.0 as total_debits,
+    SUM(CASE WHEN t.transaction_type = 'credit' THEN t.amount ELSE 0 END) / 100.0 as total_credits,
+    AVG(t.amount) / 100.0 as avg_transaction_amount
 FROM transactions t
 JOIN bank_statements bs ON t.statement_id = bs.id
 WHERE t.transaction_date IS NOT NULL
@@ -311,15 +312,15 @@ RETURNS TABLE(
     calculated DECIMAL(12, 2);
 BEGIN
     -- Get statement balances
-    SELECT opening_balance, closing_balance
+    SELECT opening_balance / 100.0, closing_balance / 100.0
     INTO opening, closing
     FROM bank_statements
     WHERE id = statement_id;
     
     -- Calculate totals from transactions
     SELECT 
-        COALESCE(SUM(CASE WHEN transaction_type = 'credit' THEN amount ELSE 0 END), 0),
-        COALESCE(SUM(CASE WHEN transaction_type = 'debit' THEN amount ELSE 0 END), 0)
+        COALESCE(SUM(CASE WHEN transaction_type = 'credit' THEN amount ELSE 0 END), 0) / 100.0,
+        COALESCE(SUM(CASE WHEN transaction_type = 'debit' THEN amount ELSE 0 END), 0) / 100.0
     INTO total_credits, total_debits
     FROM transactions
     WHERE transactions.statement_id = check_balance_consistency.statement_id;
@@ -407,7 +408,7 @@ INSERT INTO banks (name, code, date_format, statement_patterns, config_json, is_
 
 ('Wells Fargo', 'WF', 'MM/DD/YYYY',
  '{"account_number": "Account\\s*#?:?\\s*(\\d+)", "balance": "Balance:?\\s*\\$?([\\d,]+\\.?\\d*)", "transaction": "(\\d{2}/\\d{2}/\\d{4})\\s+(.*?)\\s+\\$?([\\d,]+\\.?\\d*)"}',
- '{"requires_ocr": true, "supported_formats": ["pdf", "jpg", "png"]}', true);
+ '{"requires_ocr": true, "supported_formats": ["pdf", "jpg", "png"], "preprocess": ["deskew", "upscale", "equalize", "otsu"]}', true);
 
 -- Insert default transaction categories
 INSERT INTO transaction_categories (name, parent_id, keywords, color, icon) VALUES
@@ -1,22 +1,176 @@
 import os
-from flask import Flask, render_template, request, jsonify, send_from_directory, flash, redirect, url_for, send_file
-from werkzeug.utils import secure_filename
+from flask import Flask, render_template, request, jsonify, send_file, Response, make_response
+from flask.json.provider import JSONProvider
 from datetime import datetime
-import json
-import tempfile
-import shutil
-import pandas as pd
+from urllib.parse import quote
+import csv
+import functools
+import hashlib
+import io
+import time
+import orjson
+import pyarrow as pa
+import pyarrow.feather as pa_feather
+import pyarrow.parquet as pa_parquet
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, for request bodies and jsonify"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype='application/json')
+
 app = Flask(__name__,
             template_folder='src',
             static_folder='src/static')
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+app.json = OrjsonProvider(app)
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', '16')) * 1024 * 1024
 
 BACKEND_API_URL = os.environ.get('BACKEND_API_URL', 'http://localhost:5001')
+OCR_POLL_INTERVAL = float(os.environ.get('OCR_POLL_INTERVAL', '1'))
+OCR_POLL_TIMEOUT = float(os.environ.get('OCR_POLL_TIMEOUT', '300'))
+# Socket timeouts for backend calls (seconds). gevent workers don't time out
+# a stalled request on their own, so every call needs them
+BACKEND_CONNECT_TIMEOUT = float(os.environ.get('BACKEND_CONNECT_TIMEOUT', '5'))
+BACKEND_READ_TIMEOUT = float(os.environ.get('BACKEND_READ_TIMEOUT', '60'))
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
+_ALLOWED_SUFFIXES = tuple(f'.{ext}' for ext in ALLOWED_EXTENSIONS)
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Column order for CSV exports, matching the backend's Transaction.to_dict.
+# Any other keys follow in the order they first appear
+EXPORT_COLUMNS = (
+    'transaction_date', 'posting_date', 'description', 'reference_number', 'amount',
+    'transaction_type', 'balance', 'category', 'subcategory', 'merchant_name',
+    'metadata', 'confidence_score', 'is_pending', 'is_flagged', 'flag_reason',
+    'id', 'statement_id', 'created_at',
+)
+_EXPORT_COLUMN_SET = frozenset(EXPORT_COLUMNS)
+
+ARROW_EXPORT_MIMETYPES = {
+    'parquet': 'application/vnd.apache.parquet',
+    'feather': 'application/vnd.apache.arrow.file',
+}
+
+# Export filenames only change once a second, so the formatted stamp is reused
+_export_stamp = (None, '')
+
+# One pooled, keep-alive session for every backend call, so requests reuse
+# open connections instead of reconnecting each time.
+# Failed connections are retried with exponential backoff
+# for any method, since nothing reached the backend. 502/503/504 responses
+# are only retried for idempotent requests (the status polls): Retry's
+# default allowed_methods excludes POST, so an upload the backend may have
+# accepted is never sent twice. 4xx responses are never retried
+session = requests.Session()
+session.headers.update({'Connection': 'keep-alive'})
+_backend_adapter = HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=100,
+    max_retries=Retry(
+        total=3,
+        connect=3,
+        backoff_factor=0.3,
+        status_forcelist=[502, 503, 504]
+    )
+)
+session.mount('http://', _backend_adapter)
+session.mount('https://', _backend_adapter)
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(_ALLOWED_SUFFIXES)
+
+def wait_for_ocr_result(status_url):
+    """
+    Poll the backend until a queued OCR job has finished
+
+    Returns:
+        Raw JSON body of the completed status response
+    """
+    deadline = time.monotonic() + OCR_POLL_TIMEOUT
+    while (remaining := deadline - time.monotonic()) > 0:
+        # A poll never waits on the backend past the overall deadline
+        status_response = session.get(
+            f"{BACKEND_API_URL}{status_url}",
+            timeout=(BACKEND_CONNECT_TIMEOUT, min(BACKEND_READ_TIMEOUT, remaining))
+        )
+        status_response.raise_for_status()
+        status = orjson.loads(status_response.content)
+        if status.get('status') == 'completed':
+            return status_response.content
+        if status.get('status') == 'failed':
+            raise RuntimeError(status.get('error') or 'OCR processing failed')
+        time.sleep(min(OCR_POLL_INTERVAL, max(0, deadline - time.monotonic())))
+    raise TimeoutError('Timed out waiting for OCR processing')
+
+def export_filename(prefix, extension):
+    """Timestamped download name for an export"""
+    global _export_stamp
+    second = int(time.time())
+    if _export_stamp[0] != second:
+        _export_stamp = (second, datetime.fromtimestamp(second).strftime('%Y%m%d_%H%M%S'))
+    return f'{prefix}_{_export_stamp[1]}.{extension}'
+
+def export_fieldnames(transactions):
+    """CSV columns: the known transaction fields in a fixed order, then any extras"""
+    present = dict.fromkeys(key for transaction in transactions for key in transaction)
+    return ([column for column in EXPORT_COLUMNS if column in present]
+            + [key for key in present if key not in _EXPORT_COLUMN_SET])
+
+def arrow_table(transactions, fieldnames):
+    """Pivot transaction dicts into an Arrow table with the given columns"""
+    return pa.table({name: [transaction.get(name) for transaction in transactions] for name in fieldnames})
+
+def write_arrow_file(transactions, fieldnames, format):
+    """Render transactions as a zstd-compressed Parquet or Feather file"""
+    table = arrow_table(transactions, fieldnames)
+    sink = pa.BufferOutputStream()
+    if format == 'parquet':
+        pa_parquet.write_table(table, sink, compression='zstd')
+    else:
+        pa_feather.write_feather(table, sink, compression='zstd')
+    return sink.getvalue().to_pybytes()
+
+def generate_csv(transactions, fieldnames):
+    """Yield CSV text for the transactions a chunk at a time"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    for transaction in transactions:
+        writer.writerow(transaction)
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def send_bytes(body, mimetype, filename):
+    """Send an in-memory export as a file download with a Content-Length"""
+    return send_file(io.BytesIO(body), mimetype=mimetype, as_attachment=True, download_name=filename)
+
+def attachment(chunks, mimetype, filename):
+    """Stream chunks to the client as a file download"""
+    return Response(
+        chunks,
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@app.before_request
+def reject_oversized_uploads():
+    # Refuse on the declared Content-Length alone, before any body is read
+    max_length = app.config['MAX_CONTENT_LENGTH']
+    if request.content_length is not None and request.content_length > max_length:
+        return jsonify({'error': f'File too large. Maximum size is {max_length // (1024 * 1024)} MB'}), 413
 
 @app.route('/')
 def index():
@@ -36,19 +190,41 @@ def upload_file():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Invalid file type. Please upload PDF or image files'}), 400
 
-        files = {'file': (file.filename, file.stream, file.content_type)}
-
-        backend_response = requests.post(f"{BACKEND_API_URL}/ocr/process", files=files)
+        # Stream the upload's spooled stream to the backend as the raw request
+        # body, with no multipart framing to build here or parse there
+        headers = {
+            'Content-Type': file.content_type or 'application/octet-stream',
+            'X-Filename': quote(file.filename)
+        }
+        # Lets the backend apply the bank's OCR preprocessing profile
+        bank = request.form.get('bank')
+        if bank:
+            headers['X-Bank-Code'] = bank
+        backend_response = session.post(
+            f"{BACKEND_API_URL}/ocr/process",
+            data=file.stream,
+            headers=headers,
+            timeout=(BACKEND_CONNECT_TIMEOUT, BACKEND_READ_TIMEOUT)
+        )
         backend_response.raise_for_status()
 
-        ocr_result = backend_response.json()
+        ocr_result = orjson.loads(backend_response.content)
+        if ocr_result.get('status_url'):
+            # The completed status already carries every field the page
+            # needs, so its bytes are passed through without re-encoding
+            return app.response_class(
+                wait_for_ocr_result(ocr_result['status_url']),
+                mimetype='application/json'
+            )
 
+        # A backend that answers synchronously returns the OCR result itself
+        transactions = ocr_result.get('transactions', [])
         response_data = {
             'success': True,
             'filename': ocr_result.get('filename'),
             'account_info': ocr_result.get('account_info', {}),
-            'transactions': ocr_result.get('transactions', []),
-            'transaction_count': len(ocr_result.get('transactions', [])),
+            'transactions': transactions,
+            'transaction_count': len(transactions),
             'raw_text_preview': ocr_result.get('raw_text_preview', '')
         }
 
@@ -59,36 +235,63 @@ def upload_file():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def conditional_export(view):
+    """
+    Tag export downloads with an ETag of the posted data and export format
+
+    A client that sends the tag back in If-None-Match gets a 304 before
+    anything is parsed or serialized. Werkzeug only evaluates conditional
+    requests for GET and HEAD, so the check is done here for these POSTs.
+    """
+    @functools.wraps(view)
+    def wrapper(format, **kwargs):
+        digest = hashlib.blake2b(request.get_data(), digest_size=16)
+        digest.update(format.encode('utf-8'))
+        etag = digest.hexdigest()
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = make_response(view(format, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        return response
+    return wrapper
+
 @app.route('/export/<format>', methods=['POST'])
+@conditional_export
 def export_data(format):
     try:
         data = request.json
         transactions = data.get('transactions', [])
         
         if format == 'csv':
-            df = pd.DataFrame(transactions)
-
-            temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False)
-            df.to_csv(temp_file.name, index=False)
-            temp_file.close()
-            
-            return send_file(
-                temp_file.name,
-                as_attachment=True,
-                download_name=f'transactions_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
-                mimetype='text/csv'
+            # Rows are streamed to the client as they are written, with no temp
+            # file. Every export goes through the csv module so the dialect
+            # (quoting, CRLF line ends, True/False) never depends on row count
+            return attachment(
+                generate_csv(transactions, export_fieldnames(transactions)),
+                'text/csv',
+                export_filename('transactions', 'csv')
             )
         
         elif format == 'json':
-            temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False)
-            json.dump(data, temp_file, indent=2)
-            temp_file.close()
+            return send_bytes(
+                orjson.dumps(data, option=orjson.OPT_INDENT_2),
+                'application/json',
+                export_filename('statement_data', 'json')
+            )
+        
+        elif format in ARROW_EXPORT_MIMETYPES:
+            try:
+                body = write_arrow_file(transactions, export_fieldnames(transactions), format)
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                return jsonify({'error': f'Transactions cannot be exported as {format}: {e}'}), 400
             
-            return send_file(
-                temp_file.name,
-                as_attachment=True,
-                download_name=f'statement_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json',
-                mimetype='application/json'
+            return send_bytes(
+                body,
+                ARROW_EXPORT_MIMETYPES[format],
+                export_filename('transactions', format)
             )
         
         else:
@@ -0,0 +1,24 @@
+# Gunicorn configuration for the frontend proxy
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# The frontend mostly waits on the backend (forwarding uploads, polling OCR
+# status), so cooperative gevent workers let one process hold many of those
+# waits at once. The worker monkey-patches sockets before loading the app,
+# so the requests session yields instead of blocking
+worker_class = 'gevent'
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+
+# The app is not preloaded: the session's connection pool must be created
+# after gevent has patched the worker process
+preload_app = False
+
+# Uploads wait for OCR to finish, bounded by OCR_POLL_TIMEOUT
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '330'))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
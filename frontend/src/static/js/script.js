@@ -1,6 +1,8 @@
 // Global variables
 let selectedFile = null;
 let processedData = null;
+// Last download per export format, reused when the server answers 304
+const exportCache = {};
 
 // DOM elements
 const uploadArea = document.getElementById('upload-area');
@@ -37,6 +39,8 @@ function setupEventListeners() {
     // Export buttons
     document.getElementById('export-csv').addEventListener('click', () => exportData('csv'));
     document.getElementById('export-json').addEventListener('click', () => exportData('json'));
+    document.getElementById('export-parquet').addEventListener('click', () => exportData('parquet'));
+    document.getElementById('export-feather').addEventListener('click', () => exportData('feather'));
     
     // Raw text toggle
     document.getElementById('show-raw').addEventListener('click', showRawText);
@@ -123,6 +127,10 @@ async function processFile() {
     // Prepare form data
     const formData = new FormData();
     formData.append('file', selectedFile);
+    const bank = document.getElementById('bank-select').value;
+    if (bank) {
+        formData.append('bank', bank);
+    }
     
     // Show loading state
     processBtn.disabled = true;
@@ -180,7 +188,7 @@ function displayResults(data) {
             const row = document.createElement('tr');
             row.innerHTML = `
                 <td>${index + 1}</td>
-                <td>${transaction.date || '-'}</td>
+                <td>${transaction.date || transaction.transaction_date || '-'}</td>
                 <td>${transaction.description || '-'}</td>
                 <td>${transaction.amount || '-'}</td>
             `;
@@ -223,16 +231,32 @@ async function exportData(format) {
     }
     
     try {
+        // Browsers don't revalidate POSTs on their own, so send the tag of the
+        // last download of this format and reuse its blob if nothing changed
+        const headers = { 'Content-Type': 'application/json' };
+        const cached = exportCache[format];
+        if (cached) {
+            headers['If-None-Match'] = cached.etag;
+        }
         const response = await fetch(`/export/${format}`, {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(processedData)
+            headers,
+            body: JSON.stringify(processedData),
+            cache: 'no-store'
         });
         
-        if (response.ok) {
-            const blob = await response.blob();
+        let blob = null;
+        if (response.status === 304 && cached) {
+            blob = cached.blob;
+        } else if (response.ok) {
+            blob = await response.blob();
+            const etag = response.headers.get('ETag');
+            if (etag) {
+                exportCache[format] = { etag, blob };
+            }
+        }
+        
+        if (blob) {
             const url = window.URL.createObjectURL(blob);
             const a = document.createElement('a');
             a.href = url;
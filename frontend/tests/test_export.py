@@ -0,0 +1,34 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from app import app
+
+def test_export_returns_not_modified_for_matching_etag():
+    client = app.test_client()
+    data = {'transactions': [{'description': 'Coffee', 'amount': 4.5}]}
+
+    response = client.post('/export/csv', json=data)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    cached = client.post('/export/csv', json=data, headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+    other_format = client.post('/export/json', json=data, headers={'If-None-Match': etag})
+    assert other_format.status_code == 200
+
+def test_csv_export_dialect_does_not_depend_on_row_count():
+    client = app.test_client()
+    row = {'description': 'Coffee, large', 'amount': 4.5, 'is_pending': False, 'balance': None}
+
+    small = client.post('/export/csv', json={'transactions': [row] * 10}).data
+    large = client.post('/export/csv', json={'transactions': [row] * 6000}).data
+
+    header, first_row = small.split(b'\r\n')[:2]
+    assert header == b'description,amount,balance,is_pending'
+    assert first_row == b'"Coffee, large",4.5,,False'
+    assert large.startswith(small[:-len(b'\r\n')])
+    assert large.count(b'\r\n') == 6001
+    assert b'\n' not in large.replace(b'\r\n', b'')
@@ -1,15 +1,16 @@
 import io
+import json
 import os
 import sys
 import requests
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from app import app
+from app import app, BACKEND_CONNECT_TIMEOUT, BACKEND_READ_TIMEOUT
 
 def test_upload_backend_unavailable(monkeypatch):
     def mock_post(*args, **kwargs):
         raise requests.exceptions.ConnectionError("Backend unavailable")
-    monkeypatch.setattr(requests, "post", mock_post)
+    monkeypatch.setattr("app.session.post", mock_post)
 
     client = app.test_client()
     data = {
@@ -20,3 +21,71 @@ def test_upload_backend_unavailable(monkeypatch):
     payload = response.get_json()
     assert 'error' in payload
     assert 'Backend unavailable' in payload['error']
+
+class MockResponse:
+    def __init__(self, payload):
+        self.payload = payload
+        self.content = json.dumps(payload).encode('utf-8')
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+def test_upload_polls_queued_ocr(monkeypatch):
+    def mock_post(*args, **kwargs):
+        assert kwargs['timeout'] == (BACKEND_CONNECT_TIMEOUT, BACKEND_READ_TIMEOUT)
+        return MockResponse({'success': True, 'statement_id': 'abc', 'status_url': '/ocr/status/abc'})
+    statuses = iter([
+        {'status': 'processing'},
+        {'status': 'completed', 'success': True, 'filename': 'test.pdf',
+         'transactions': [{'amount': 1.0}], 'transaction_count': 1},
+    ])
+    def mock_get(*args, **kwargs):
+        connect, read = kwargs['timeout']
+        assert 0 < read <= BACKEND_READ_TIMEOUT
+        return MockResponse(next(statuses))
+    monkeypatch.setattr("app.session.post", mock_post)
+    monkeypatch.setattr("app.session.get", mock_get)
+    monkeypatch.setattr("app.OCR_POLL_INTERVAL", 0)
+
+    client = app.test_client()
+    data = {
+        'file': (io.BytesIO(b'dummy'), 'test.pdf')
+    }
+    response = client.post('/upload', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload['filename'] == 'test.pdf'
+    assert payload['transaction_count'] == 1
+
+def test_upload_rejects_oversized_content_length(monkeypatch):
+    def mock_post(*args, **kwargs):
+        raise AssertionError("Oversized upload should not reach the backend")
+    monkeypatch.setattr("app.session.post", mock_post)
+    monkeypatch.setitem(app.config, 'MAX_CONTENT_LENGTH', 1024)
+
+    client = app.test_client()
+    data = {
+        'file': (io.BytesIO(b'x' * 2048), 'test.pdf')
+    }
+    response = client.post('/upload', data=data, content_type='multipart/form-data')
+    assert response.status_code == 413
+    assert 'error' in response.get_json()
+
+def test_upload_forwards_bank_code(monkeypatch):
+    sent = {}
+    def mock_post(*args, **kwargs):
+        sent.update(kwargs['headers'])
+        return MockResponse({'success': True, 'transactions': []})
+    monkeypatch.setattr("app.session.post", mock_post)
+
+    client = app.test_client()
+    data = {
+        'file': (io.BytesIO(b'dummy'), 'test.pdf'),
+        'bank': 'WF'
+    }
+    response = client.post('/upload', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert sent['X-Bank-Code'] == 'WF'